@@ -0,0 +1,93 @@
+'''
+Benchmark of hashtags extraction from channel posts
+
+Compares entity-based extraction with the regex used before it
+on generated posts with ASCII, Cyrillic and emoji text
+
+python benchmarks/bench_hashtags.py [number of posts]
+
+'''
+import sys
+import random
+import timeit
+import pathlib
+import importlib.util
+from types import SimpleNamespace
+
+#  Module is loaded by path, so the bot and the MTProto client aren't started
+REGEX_PATH = pathlib.Path(__file__).parent.parent / "shterens_tools" / "common" / "utils" / "regex.py"
+
+WORDS = [
+    "channel", "post", "update", "release", "news", "photo",
+    "канал", "новости", "публикация", "обновление",
+    "🔥", "🚀", "📊", "✅"
+]
+TAGS = [
+    "python", "telegram", "stats", "news", "release_notes",
+    "новости", "статистика", "中文", "tag2023"
+]
+
+
+def load_regex_module():
+    spec = importlib.util.spec_from_file_location("regex_module", REGEX_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def utf16_length(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def generate_post(tagsChance: float) -> SimpleNamespace:
+    '''
+    Returns post with text and hashtag entities as Telegram sends them
+    '''
+    parts = []
+    entities = []
+    offset = 0
+
+    for _ in range(random.randint(5, 60)):
+        if random.random() < tagsChance:
+            word = "#" + random.choice(TAGS)
+            entities.append(SimpleNamespace(type="hashtag", offset=offset, length=utf16_length(word)))
+        else:
+            word = random.choice(WORDS)
+
+        parts.append(word)
+        offset += utf16_length(word) + 1
+
+    return SimpleNamespace(
+        text=" ".join(parts),
+        entities=entities or None,
+        caption=None,
+        caption_entities=None
+    )
+
+
+def main():
+    postsNumber = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    regex = load_regex_module()
+
+    random.seed(0)
+    posts = [generate_post(random.choice([0.0, 0.02, 0.1])) for _ in range(postsNumber)]
+
+    mismatches = sum(
+        set(regex.hashtags_in_text(post)) != set(regex.hashtags_in_text_regex(post.text))
+        for post in posts
+    )
+
+    implementations = {
+        "regex": lambda: [regex.hashtags_in_text_regex(post.text) for post in posts],
+        "entities": lambda: [regex.hashtags_in_text(post) for post in posts]
+    }
+
+    print(f"{postsNumber} posts, {mismatches} posts with different tags")
+
+    for name, run in implementations.items():
+        seconds = min(timeit.repeat(run, number=1, repeat=5))
+        print(f"{name:>10} : {seconds * 1000:8.2f} ms, {seconds / postsNumber * 10**6:6.2f} us per post")
+
+
+if __name__ == "__main__":
+    main()
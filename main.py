@@ -27,6 +27,10 @@ else:
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
 
+#  Read the user once per update for handlers and locales
+dispatcher.middleware.setup(UserContextMiddleware())
+
+
 if USE_MULTI:
     from aiogram.utils.executor import start_webhook
     from aiogram.contrib.middlewares.logging import LoggingMiddleware
@@ -38,6 +42,7 @@ if USE_MULTI:
         RealProcess,
         RealLock,
         RealEvent,
+        RealLog,
         current_realprocess
     )
     from shterens_tools.common.multi_instance.network import (
@@ -77,9 +82,13 @@ def run_one_instance():
 
 
 async def main(dispatcher: Dispatcher=dispatcher):
+    await init_db()
     await app.start()
+    jobRunner.start()
     
     if USE_MULTI:
+        #  Cached users are dropped when other instances change them
+        listen_user_changes(userChanges)
         ngrokStarted.wait()
         for attempt in range(5):
             try:
@@ -109,6 +118,12 @@ def error_handler(loop: asyncio.AbstractEventLoop, context: dict):
 
 
 async def on_shutdown(loop: asyncio.AbstractEventLoop):
+    #  Save buffered channel posts, user changes
+    #  and jobs checkpoints in every instance
+    await liveIndexer.flush()
+    await userWrites.stop()
+    await jobRunner.stop()
+
     if USE_MULTI:
         await bot.delete_webhook()
         if current_realprocess() != "MainProcess":
@@ -131,7 +146,10 @@ asyncio.set_event_loop(loop)
 
 
 if __name__ == "__main__":
-    
+    #  Rate limiter state is shared by instances through memory that outlives
+    #  them, so the rate decreased before the restart is reset
+    mtprotoLimiter.reset()
+
     if USE_MULTI:
         
         ExManager.create_object("queue", ExQueue)
@@ -146,12 +164,16 @@ if __name__ == "__main__":
         ExManager.create_object("ngrok", RealEvent)
         ExManager.register_access_method("get_ngrok", "ngrok")
 
+        ExManager.create_object("users", RealLog)
+        ExManager.register_access_method("get_users", "users")
+
         manager = ExManager(address=("localhost", 21000))
         manager.run_server()
 
         lock: RealLock = manager.lock
         queue: ExQueue = manager.queue
         ngrokStarted: RealEvent = manager.ngrok
+        userChanges: RealLog = manager.users
 
         #  Put first port to queue
         queue.put(WEBAPP_PORT)
@@ -162,7 +184,7 @@ if __name__ == "__main__":
         for _ in range(INSTANCES):
             process = RealProcess(
                 target=("run_one_instance", run_one_instance),
-                targetGlobals={"lock": RealLock, "queue": ExQueue, "ngrokStarted": RealEvent},
+                targetGlobals={"lock": RealLock, "queue": ExQueue, "ngrokStarted": RealEvent, "userChanges": RealLog},
                 manager=manager
             )
             process.start()
@@ -193,3 +215,5 @@ if __name__ == "__main__":
     
     else:
         run_one_instance()
+
+    mtprotoLimiter.unlink()
@@ -35,3 +35,17 @@ async def channel_added(memberInfo: types.ChatMemberUpdated):
 
     elif memberInfo.new_chat_member.is_kicked():
         print("Remove from list")
+
+
+@dispatcher.channel_post_handler(content_types=["any"])
+async def channel_post(message: types.Message):
+    '''
+    Indexes posts of channels where the bot is an admin
+
+    '''
+    liveIndexer.add(message)
+
+
+@dispatcher.edited_channel_post_handler(content_types=["any"])
+async def edited_channel_post(message: types.Message):
+    liveIndexer.add(message, edited=True)
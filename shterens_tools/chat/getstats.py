@@ -1,7 +1,23 @@
+import heapq
 import typing
 import asyncio
+import datetime
 from ..common import *
 
+#  Ranges larger than this are split into chunks processed by all instances
+GETSTATS_CHUNK_SIZE = 5000
+#  Number of chunks processed at the same time by one instance
+GETSTATS_CHUNK_CONCURRENCY = 2
+#  Number of tags shown by /getstats top without a number
+GETSTATS_TOP_DEFAULT = 100
+#  Number of the last periods shown by /getstats trend
+GETSTATS_TREND_LIMIT = 60
+#  Number of the most frequent tags shown for every period of the trend
+GETSTATS_TREND_TAGS = 3
+#  Number of the last days shown by /getstats histogram
+GETSTATS_HISTOGRAM_LIMIT = 60
+
+
 class GetStats(StatesGroup):
     waiting_for_channel_link = State()
     checking_channel_permission = State()
@@ -11,12 +27,16 @@ class GetStats(StatesGroup):
 
 
 @dispatcher.message_handler(commands="getstats")
-async def getstats(message: types.Message):
+async def getstats(message: types.Message, state: FSMContext):
     '''
     Entry point in /getstats
     Get statistics for the channel
+
+    Options can be passed as arguments, see getstats_options()
     
     '''
+    await state.update_data(options=getstats_options(message.get_args()))
+
     keyboard = types.InlineKeyboardMarkup()
     keyboard.add(
         types.InlineKeyboardButton(
@@ -31,6 +51,47 @@ async def getstats(message: types.Message):
     )
 
 
+def getstats_options(args: str) -> dict:
+    '''
+    Parses /getstats arguments
+
+    top[=N] : Show approximately N most frequent tags counted
+        in bounded memory, useful for channels with unique tags
+    sample[=N] : Estimate stats from N random windows of the range
+    refine : Collect the exact stats after sending the estimate
+    days=N : Count posts published in the last N days
+    trend[=day|week|month] : Add posts and top tags per period,
+        read from the channel rollups
+    histogram : Add number of posts per day of the range
+
+    Unknown arguments are ignored
+    '''
+    options = {}
+
+    for arg in args.lower().split():
+        name, _, value = arg.partition("=")
+
+        if name == "top":
+            options["topK"] = int(value) if value.isdigit() and int(value) > 0 else GETSTATS_TOP_DEFAULT
+
+        elif name == "sample":
+            options["sampleWindows"] = int(value) if value.isdigit() and int(value) > 0 else SAMPLE_WINDOWS
+
+        elif name == "refine":
+            options["refine"] = True
+
+        elif name == "days" and value.isdigit() and int(value) > 0:
+            options["days"] = int(value)
+
+        elif name == "trend":
+            options["trend"] = value if value in ROLLUP_PERIODS else "month"
+
+        elif name == "histogram":
+            options["histogram"] = True
+
+    return options
+
+
 @dispatcher.callback_query_handler(text="getstats-start", state="*")
 async def getstats_start(call: types.CallbackQuery, state: FSMContext):
     '''
@@ -48,6 +109,7 @@ async def getstats_start(call: types.CallbackQuery, state: FSMContext):
 async def cancel(message: types.Message, state: FSMContext):
     if await state.get_state() is None:
         return
+    await jobRunner.cancel(message.from_user.id)
     await state.finish()
     await message.answer(
         await locale_string_by_id("cancel", message.from_user.id), 
@@ -208,6 +270,30 @@ async def getstats_message_range(message: types.Message, state: FSMContext):
     '''
     getstatsData = await state.get_data()
 
+    if getstatsData["substate"] == "range-start" and "days" in getstatsData.get("options", {}):
+        try:
+            lastId = await get_last_post_id(getstatsData["id"])
+            startDate = datetime.datetime.now() - datetime.timedelta(days=getstatsData["options"]["days"])
+            startId = await resolve_date(getstatsData["id"], startDate, lastId)
+        except RPCError:
+            await message.answer(
+                await locale_string_by_id("getstats-permission-error", message.from_user.id)
+            )
+            return
+
+        if startId <= lastId:
+            await state.update_data(substate="tags-options", range=[startId, lastId])
+            await GetStats.waiting_for_tags_preferences.set()
+            await getstats_tags(message, state)
+            return
+        
+        #  No posts in the last days, the range is selected manually
+        await message.answer(
+            await locale_string_by_id("getstats-message-range-date-error", message.from_user.id)
+        )
+        getstatsData["options"].pop("days")
+        await state.update_data(options=getstatsData["options"])
+
     if getstatsData["substate"] == "range-start":
         keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
         keyboard.add(
@@ -253,8 +339,31 @@ async def getstats_message_range(message: types.Message, state: FSMContext):
                 await state.update_data(substate="range-end")
             
             else:
+                date = parse_date(message.html_text)
                 isPost, accessType = is_post_link(message.html_text)
-                if isPost:
+
+                if date is not None:
+                    try:
+                        lastId = await get_last_post_id(getstatsData["id"])
+                        startId = await resolve_date(getstatsData["id"], date, lastId)
+                    except RPCError:
+                        await message.answer(
+                            await locale_string_by_id("getstats-permission-error", message.from_user.id)
+                        )
+                        return
+                    
+                    if startId <= lastId:
+                        await message.answer(
+                            await locale_string_by_id("getstats-message-range-end", message.from_user.id), 
+                            reply_markup=types.ReplyKeyboardRemove()
+                        )
+                        await state.update_data(substate="range-end", range=[startId, 1])
+                    else:
+                        await message.answer(
+                            await locale_string_by_id("getstats-message-range-date-error", message.from_user.id)
+                        )
+
+                elif isPost:
                     try:
                         chatId, messageId = parse_post_link(message.html_text, accessType)
                         
@@ -314,8 +423,32 @@ async def getstats_message_range(message: types.Message, state: FSMContext):
                 )
         
         elif message.text or message.caption:
+            date = parse_date(message.html_text)
             isPost, accessType = is_post_link(message.html_text)
-            if isPost:
+
+            if date is not None:
+                try:
+                    #  Last post published before the next day
+                    endId = await resolve_date(getstatsData["id"], date + datetime.timedelta(days=1)) - 1
+                except RPCError:
+                    await message.answer(
+                        await locale_string_by_id("getstats-permission-error", message.from_user.id)
+                    )
+                    return
+                
+                if endId >= getstatsData["range"][0]:
+                    await state.update_data(
+                        substate="tags-options", 
+                        range=[getstatsData["range"][0], endId]
+                    )
+                    await GetStats.next()
+                    await getstats_tags(message, state)
+                else:
+                    await message.answer(
+                        await locale_string_by_id("getstats-message-range-end-error", message.from_user.id)
+                    )
+
+            elif isPost:
                 try:
                     chatId, messageId = parse_post_link(message.html_text, accessType)
                     
@@ -419,15 +552,13 @@ async def getstats_tags(message: types.Message, state: FSMContext):
 async def getstats_processing(message: types.Message, state: FSMContext, inChannel: bool=False):
     '''
     /getstats : Processing channel's stats
+    
+    Stats are collected by a background job, see getstats_job()
+    and getstats_sample_job()
 
     '''
     getstatsData = await state.get_data()
 
-    #  Pyrogram needs to cache access hash, and then the channel can be accessed by its id
-    #  This happens in the case of public channels, in which it is not necessary to add a bot
-    if "username" in getstatsData:
-        await app.get_chat(getstatsData["username"])
-    
     #  That it is currently only possible to edit messages without reply_markup
     progressMessage = await message.answer(
         await locale_string_by_id("getstats-args-saved", message.from_user.id),
@@ -437,147 +568,549 @@ async def getstats_processing(message: types.Message, state: FSMContext, inChann
     progressMessage = await message.answer(
         await locale_string_by_id("getstats-preprocessing", message.from_user.id)
     )
+
+    params = {
+        "id": getstatsData["id"],
+        "name": getstatsData["name"],
+        "range": getstatsData["range"],
+        "include": getstatsData["include"],
+        "exclude": getstatsData["exclude"],
+        "inChannel": inChannel,
+        "histogram": getstatsData.get("options", {}).get("histogram", False),
+        "topK": getstatsData.get("options", {}).get("topK"),
+        "sample": getstatsData.get("options", {}).get("sampleWindows"),
+        "refine": getstatsData.get("options", {}).get("refine", False),
+        "trend": getstatsData.get("options", {}).get("trend"),
+        "progressMessage": progressMessage.message_id
+    }
+
+    if "username" in getstatsData:
+        params["username"] = getstatsData["username"]
+
+    if params["sample"]:
+        jobId = await jobRunner.submit("getstats-sample", message.from_user.id, params)
+    else:
+        jobId = await jobRunner.submit("getstats", message.from_user.id, params)
+    await state.update_data(substate="processing.searching_for_tags", job=jobId)
+
+
+async def finish_getstats_state(job: Job, state: FSMContext):
+    '''
+    Finishes /getstats state of the job's user, unless the user has
+    started another /getstats since, e.g. the job was resumed after a restart
+    '''
+    getstatsData = await state.get_data()
+
+    #  Job id is saved right after the job is submitted
+    if getstatsData.get("substate", "").startswith("processing") and getstatsData.get("job", job.id) == job.id:
+        await state.finish()
+
+
+@jobRunner.register("getstats")
+async def getstats_job(job: Job):
+    '''
+    /getstats : Processing channel's stats in background job
+
+    Large ranges are split into chunks processed by all instances,
+    see getstats_chunk_job()
+
+    Identical requests made at the same time share one scan
+    and recent results are reused, see resultCache
+
+    '''
+    getstatsData = job.params
+    userId = job.user
+    state = state_by_id(userId)
     
-    stats = {"messages": [], "tags": {}}
     startId = getstatsData["range"][0]
     endId = getstatsData["range"][1]
     
     #  Create progressbar
     progress = ProgressBar(
         tasks=endId-startId+1,
-        prefix=await locale_string_by_id("getstats-processing-prefix", message.from_user.id)
+        prefix=await locale_string_by_id("getstats-processing-prefix", userId)
     )
 
-    await state.update_data(substate="processing.searching_for_tags")
+    async def on_progress(done: int):
+        if progress.update(done):
+            await bot.edit_message_text(progress.get(), userId, getstatsData["progressMessage"])
 
-    try:
-        while startId < endId+1:
-            for attempt in range(5):
-                try:
-                    post = await get_post_messages(chatId=getstatsData["id"], messageId=startId)
-                    post[0] = MTProtoMessage(post[0])
-                    
-                    if not post[0].empty and not post[0].is_service_message():
-                        stats["messages"].append(post[0].id)
-                        tags = hashtags_in_text(post[0])
-                        for tag in tags:
-                            if tag in stats["tags"]:
-                                stats["tags"][tag] += 1
-                            else:
-                                stats["tags"][tag] = 1
-                            await asyncio.sleep(0)
-                    
-                    if progress.update(len(post)):
-                        await progressMessage.edit_text(progress.get())
-                    
-                    startId = post[-1].id + 1
-                    await asyncio.sleep(0)
+    async def scan() -> dict | None:
+        if endId - startId + 1 > GETSTATS_CHUNK_SIZE:
+            return await getstats_chunks(job, on_progress)
+        else:
+            return await scan_job_range(job, startId, endId, on_progress)
 
-                    #  Checks if /cancel has been called
-                    if await state.get_state() is None:
-                        return
-                
-                except FloodWait as e:
-                    await asyncio.sleep(e.value)
-                else:
-                    break
-            else:
-                raise FloodWait
+    try:
+        result = await resultCache.get_or_compute(
+            getstats_result_key(getstatsData),
+            scan,
+            lambda: job.cancelled
+        )
+        
+        if result is None:
+            job.status = JobStatus.CANCELLED
+            return
         else:
+            stats = result["stats"]
+
             #  Finish progress bar if it's not
             if progress.isNotFinised:
-                await progressMessage.edit_text(progress.get())
-            
-            await state.update_data(substate="processing.applying_tags_preferences")
-
-            tags = stats["tags"].copy().keys()
-            include = getstatsData["include"]
-            exclude = getstatsData["exclude"]
+                await bot.edit_message_text(progress.get(), userId, getstatsData["progressMessage"])
             
-            if include:
-                for tag in tags:
-                    if tag not in include:
-                        stats["tags"].pop(tag)
-                    await asyncio.sleep(0)
-
-            elif exclude:
-                for tag in exclude:
-                    stats["tags"].pop(tag, None)
-                    await asyncio.sleep(0)
+            #  Include and exclude lists are applied during the scan
+            tagsCounts = stats.tags
 
             await state.update_data(substate="processing.creating_stats_message")
 
-            if inChannel:
-                statsResult = await locale_string_by_id("getstats-processing-result-in-channel", message.from_user.id)
+            if not stats.count:
+                #  Nothing to reference, e.g. every post of the range is deleted
+                statsResult = await locale_string_by_id("getstats-processing-result-no-posts", userId)
+                statsResult = statsResult.format(getstatsData["name"])
+            elif getstatsData["inChannel"]:
+                statsResult = await locale_string_by_id("getstats-processing-result-in-channel", userId)
                 statsResult = statsResult.format(
-                    await create_post_reference(getstatsData, stats["messages"][0]),
-                    len(stats["messages"]),
-                    await create_tags_list(stats["tags"], message.from_user.id)
+                    create_post_reference(getstatsData, stats.first, stats.firstDate),
+                    stats.count,
+                    await create_tags_list(tagsCounts, userId, getstatsData["topK"])
                 )
                 #  Edit in channel action
             else:
-                statsResult = await locale_string_by_id("getstats-processing-result", message.from_user.id)
+                statsResult = await locale_string_by_id("getstats-processing-result", userId)
                 statsResult = statsResult.format(
                     getstatsData["name"],
-                    await create_post_reference(getstatsData, stats["messages"][0]),
-                    await create_post_reference(getstatsData, stats["messages"][-1]),
-                    len(stats["messages"]),
-                    await create_tags_list(stats["tags"], message.from_user.id)
+                    create_post_reference(getstatsData, stats.first, stats.firstDate),
+                    create_post_reference(getstatsData, stats.last, stats.lastDate),
+                    stats.count,
+                    await create_tags_list(tagsCounts, userId, getstatsData["topK"])
                 )
+
+            if stats.count and stats.heavyHitters is not None:
+                approximate = await locale_string_by_id("getstats-processing-result-approximate", userId)
+                statsResult += "\n" + approximate.format(getstatsData["topK"], stats.heavyHitters.maxError)
+
+            if stats.histogram and stats.days:
+                statsResult += "\n\n" + await create_histogram(stats.days, userId)
+
+            if getstatsData.get("trend") and stats.firstDate is not None:
+                statsResult += "\n\n" + await create_trend(getstatsData, stats, userId)
             
-            logger.info(f"/getstats : Statistics generated for «{getstatsData['name']}» by user with id {message.from_user.id}")
-            await message.answer(
+            logger.info(f"/getstats : Statistics generated for «{getstatsData['name']}» by user with id {userId}")
+            await bot.send_message(
+                chat_id=userId,
                 text=statsResult, 
                 disable_web_page_preview=True
             )
     
     except NotAcceptable:
-        logger.error(f"/getstats : NotAcceptable : Statistics for «{getstatsData['name']}» by user with id {message.from_user.id}")
-        await message.answer(
-            await locale_string_by_id("getstats-processing-access-error", message.from_user.id)
+        logger.error(f"/getstats : NotAcceptable : Statistics for «{getstatsData['name']}» by user with id {userId}")
+        await bot.send_message(
+            userId,
+            await locale_string_by_id("getstats-processing-access-error", userId)
         )
     
     except FloodWait:
-        logger.error(f"/getstats : FloodWait : Statistics for «{getstatsData['name']}» by user with id {message.from_user.id}")
-        await message.answer(
-            await locale_string_by_id("getstats-processing-flood-error", message.from_user.id)
+        logger.error(f"/getstats : FloodWait : Statistics for «{getstatsData['name']}» by user with id {userId}")
+        await bot.send_message(
+            userId,
+            await locale_string_by_id("getstats-processing-flood-error", userId)
         )
     
-    await state.finish()
+    except Exception:
+        #  Error is logged by the job runner
+        try:
+            await bot.send_message(
+                userId,
+                await locale_string_by_id("getstats-processing-error", userId)
+            )
+        finally:
+            await finish_getstats_state(job, state)
+        raise
+    
+    await finish_getstats_state(job, state)
+
 
+@jobRunner.register("getstats-sample")
+async def getstats_sample_job(job: Job):
+    '''
+    /getstats sample : Estimating channel's stats from random windows
+    of the range in background job, see sample_range()
+
+    With refine option the exact stats are collected
+    by a getstats job after the estimate is sent
 
-async def create_post_reference(data: dict, messageId: int) -> str:    
+    '''
+    getstatsData = job.params
+    userId = job.user
+    state = state_by_id(userId)
     
-    if "username" in data:
-        channel = data["username"]
-    else:
-        channel = data["id"]
+    startId = getstatsData["range"][0]
+    endId = getstatsData["range"][1]
     
-    for attempt in range(5):
+    #  Create progressbar
+    progress = ProgressBar(
+        tasks=min(endId-startId+1, getstatsData["sample"]*MESSAGES_WINDOW_SIZE),
+        prefix=await locale_string_by_id("getstats-processing-prefix", userId)
+    )
+
+    async def on_progress(done: int) -> bool:
+        if progress.update(done):
+            await bot.edit_message_text(progress.get(), userId, getstatsData["progressMessage"])
+        
+        #  Checks if /cancel has been called
+        return not job.cancelled
+
+    try:
+        result = await sample_range(
+            getstatsData["id"],
+            startId,
+            endId,
+            getstatsData["sample"],
+            on_progress,
+            await TagFilter.from_tags(getstatsData["include"], getstatsData["exclude"])
+        )
+
+        if result is None:
+            job.status = JobStatus.CANCELLED
+            return
+        
+        estimate, sampled = result
+
+        #  Finish progress bar if it's not
+        if progress.isNotFinised:
+            await bot.edit_message_text(progress.get(), userId, getstatsData["progressMessage"])
+        
+        await state.update_data(substate="processing.creating_stats_message")
+
+        if sampled.count:
+            firstPost = create_post_reference(getstatsData, sampled.first, sampled.firstDate)
+            lastPost = create_post_reference(getstatsData, sampled.last, sampled.lastDate)
+        else:
+            firstPost, lastPost = startId, endId
+
+        posts, postsMargin = estimate.posts
+        statsResult = await locale_string_by_id("getstats-sampling-result", userId)
+        statsResult = statsResult.format(
+            getstatsData["name"],
+            firstPost,
+            lastPost,
+            posts,
+            postsMargin,
+            await create_estimates_list(estimate.tags, userId, getstatsData["topK"]),
+            estimate.sampledIds,
+            estimate.rangeSize
+        )
+
+        logger.info(f"/getstats : Statistics estimated for «{getstatsData['name']}» by user with id {userId}")
+        await bot.send_message(
+            chat_id=userId,
+            text=statsResult, 
+            disable_web_page_preview=True
+        )
+
+        if getstatsData["refine"] and not estimate.exact:
+            progressMessage = await bot.send_message(
+                userId,
+                await locale_string_by_id("getstats-preprocessing", userId)
+            )
+            jobId = await jobRunner.submit(
+                "getstats",
+                userId,
+                dict(getstatsData, progressMessage=progressMessage.message_id)
+            )
+            #  State is finished by the refining job
+            await state.update_data(substate="processing.searching_for_tags", job=jobId)
+            return
+    
+    except NotAcceptable:
+        logger.error(f"/getstats : NotAcceptable : Statistics for «{getstatsData['name']}» by user with id {userId}")
+        await bot.send_message(
+            userId,
+            await locale_string_by_id("getstats-processing-access-error", userId)
+        )
+    
+    except FloodWait:
+        logger.error(f"/getstats : FloodWait : Statistics for «{getstatsData['name']}» by user with id {userId}")
+        await bot.send_message(
+            userId,
+            await locale_string_by_id("getstats-processing-flood-error", userId)
+        )
+    
+    except Exception:
+        #  Error is logged by the job runner
         try:
-            post = await app.get_messages(
-                chat_id=channel, 
-                message_ids=messageId
+            await bot.send_message(
+                userId,
+                await locale_string_by_id("getstats-processing-error", userId)
             )
-        except FloodWait as e:
-            await asyncio.sleep(e.value)
-        else:
-            break
+        finally:
+            await finish_getstats_state(job, state)
+        raise
+    
+    await finish_getstats_state(job, state)
+
+
+def getstats_result_key(getstatsData: dict) -> tuple:
+    '''
+    Returns key of the job result in resultCache, tags are compared
+    by the normalized form, so the key doesn't need tagTable
+    '''
+    include = frozenset(map(normalize_tag, getstatsData["include"]))
+    exclude = frozenset() if include else frozenset(map(normalize_tag, getstatsData["exclude"]))
+    return (
+        getstatsData["id"],
+        getstatsData["range"][0],
+        getstatsData["range"][1],
+        include,
+        exclude,
+        getstatsData["topK"],
+        getstatsData["histogram"]
+    )
+
+
+async def scan_job_range(
+    job: Job,
+    startId: int,
+    endId: int,
+    onProgress: typing.Callable[[int], typing.Awaitable]=None
+) -> dict | None:
+    '''
+    Scans range of the job's channel, continues from the job checkpoint
+
+    :param onProgress: Coroutine function called with the number of processed ids
+
+    Returns { "stats": StatsAccumulator, "first": firstPost, "group": lastGroup },
+    see merge_scan_results(), or None if /cancel has been called
+    '''
+    getstatsData = job.params
+    tagFilter = await TagFilter.from_tags(getstatsData["include"], getstatsData["exclude"])
+
+    #  Pyrogram needs to cache access hash, and then the channel can be accessed by its id
+    #  This happens in the case of public channels, in which it is not necessary to add a bot
+    if "username" in getstatsData:
+        await app.get_chat(getstatsData["username"])
+
+    def scan_result() -> dict:
+        return {"stats": stats, "first": scanner.firstPost, "group": scanner.lastGroup}
+
+    async def on_progress(done: int) -> bool:
+        if onProgress is not None:
+            await onProgress(done)
+        
+        await job.checkpoint(scanner.lastId, lambda: scan_result_to_document(scan_result()))
+
+        #  Checks if /cancel has been called
+        return not job.cancelled
+
+    if job.lastId is None:
+        stats = StatsAccumulator(histogram=getstatsData["histogram"], topK=getstatsData["topK"])
+        scanner = ChannelScanner(getstatsData["id"], stats, on_progress, tagFilter)
+    else:
+        checkpoint = scan_result_from_document(job.checkpointData)
+        stats = checkpoint["stats"]
+        scanner = ChannelScanner(getstatsData["id"], stats, on_progress, tagFilter)
+        scanner.firstPost = checkpoint["first"]
+        scanner.lastGroup = checkpoint["group"]
+        
+        if onProgress is not None:
+            await onProgress(job.lastId-startId+1)
+        startId = job.lastId + 1
+
+    if not await scanner.scan(startId, endId):
+        return None
+
+    return scan_result()
+
+
+async def getstats_chunks(
+    job: Job,
+    onProgress: typing.Callable[[int], typing.Awaitable]
+) -> dict | None:
+    '''
+    Splits range of the job into chunks, which are put into the jobs queue
+    and processed by all instances, then merges their stats
+
+    Returns merged stats, see merge_scan_results(),
+    or None if /cancel has been called
+    '''
+    getstatsData = job.params
+    startId = getstatsData["range"][0]
+    endId = getstatsData["range"][1]
+
+    chunks = []
+    for chunkStart in range(startId, endId+1, GETSTATS_CHUNK_SIZE):
+        chunks.append(
+            dict(getstatsData, range=[chunkStart, min(chunkStart+GETSTATS_CHUNK_SIZE-1, endId)])
+        )
+    
+    await jobRunner.submit_children(job, "getstats-chunk", chunks)
+    
+    done = 0
+
+    async def on_poll(children: typing.List[dict]) -> bool:
+        nonlocal done
+        childrenDone = 0
+
+        for child in children:
+            chunkStart, chunkEnd = child["params"]["range"]
+            if child["status"] == JobStatus.DONE:
+                childrenDone += chunkEnd - chunkStart + 1
+            elif child.get("lastId") is not None:
+                childrenDone += child["lastId"] - chunkStart + 1
+
+        await onProgress(childrenDone-done)
+        done = childrenDone
+
+        #  Checks if /cancel has been called
+        return not job.cancelled
+
+    children = await jobRunner.wait_children(job, on_poll)
+
+    if children is None:
+        return None
+
+    for child in children:
+        if child["status"] == JobStatus.CANCELLED:
+            return None
+        elif child["status"] == JobStatus.FAILED:
+            raise RuntimeError(f"Chunk {child['_id']} failed")
+        elif child["result"].get("error") == "access":
+            raise NotAcceptable
+        elif child["result"].get("error") == "flood":
+            raise FloodWait
+    
+    return merge_scan_results(
+        [scan_result_from_document(child["result"]) for child in children]
+    )
+
+
+@jobRunner.register("getstats-chunk", concurrency=GETSTATS_CHUNK_CONCURRENCY)
+async def getstats_chunk_job(job: Job) -> dict | None:
+    '''
+    /getstats : Processing a chunk of the channel's range in background job
+
+    Errors are returned in the result to be handled by the parent job
+
+    '''
+    try:
+        result = await scan_job_range(job, *job.params["range"])
+    except NotAcceptable:
+        return {"error": "access"}
+    except FloodWait:
+        return {"error": "flood"}
+    
+    if result is None:
+        job.status = JobStatus.CANCELLED
+        return None
+    
+    return scan_result_to_document(result)
+
+
+def create_post_reference(data: dict, messageId: int, date: datetime.datetime) -> str:
+    '''
+    Returns link to the post with its date as text
+
+    :param date: Post date saved during the scan
+    '''
+    if "username" in data:
+        channel = data["username"]
     else:
-        raise FloodWait
+        channel = data["id"]
     
     return "<a href=\"{}\">{}</a>".format(
         get_post_link(channel, messageId), 
-        post.date.strftime("%d.%m.%Y")
+        date.strftime("%d.%m.%Y")
     )
 
 
-async def create_tags_list(tags: typing.Dict[str, int], userId: int) -> str:
-    tags = dict(sorted(tags.items(), key=lambda item: item[1], reverse=True))
+async def create_histogram(days: typing.Dict[str, int], userId: int) -> str:
+    '''
+    Returns number of posts per day for the last GETSTATS_HISTOGRAM_LIMIT days
+    with posts, days are "YYYY-MM-DD" so they are sorted as strings
+    '''
+    lines = []
+
+    for day in sorted(days)[-GETSTATS_HISTOGRAM_LIMIT:]:
+        date = datetime.datetime.strptime(day, "%Y-%m-%d")
+        lines.append(f"{date.strftime('%d.%m.%Y')} : {days[day]}")
+
+    histogram = await locale_string_by_id("getstats-processing-result-histogram", userId)
+    return histogram.format("\n".join(lines))
+
+
+async def create_trend(getstatsData: dict, stats: StatsAccumulator, userId: int) -> str:
+    '''
+    Returns number of posts and the most frequent tags per period
+    of the range, read from the channel rollups without a scan
+    '''
+    period = getstatsData["trend"]
+    rollups = await get_rollups(getstatsData["id"], period, stats.firstDate, stats.lastDate)
+    rollups = rollups[-GETSTATS_TREND_LIMIT:]
+    tagFilter = await TagFilter.from_tags(getstatsData["include"], getstatsData["exclude"])
+
+    buckets = []
+    for rollup in rollups:
+        tags = heapq.nlargest(
+            GETSTATS_TREND_TAGS,
+            tagFilter.apply_counts(rollup["tags"]).items(),
+            key=lambda item: item[1]
+        )
+        buckets.append((rollup["bucket"], rollup["posts"], tags))
+
+    names = await tagTable.names({tag for _, _, tags in buckets for tag, _ in tags})
+    lines = []
+
+    for bucket, posts, tags in buckets:
+        tagsList = ", ".join(f"{names[tag]} – {value}" for tag, value in tags if tag in names)
+        lines.append(f"{bucket} : {posts}" + (f" ({tagsList})" if tagsList else ""))
+
+    trend = await locale_string_by_id("getstats-processing-result-trend", userId)
+    return trend.format("\n".join(lines))
+
+
+async def create_estimates_list(
+    tags: typing.Dict[int, typing.Tuple[int, int]],
+    userId: int,
+    limit: int=None
+) -> str:
+    '''
+    Returns tags with estimated number of posts and margin of error,
+    see create_tags_list()
+    '''
+    if limit is None:
+        tags = sorted(tags.items(), key=lambda item: item[1][0], reverse=True)
+    else:
+        tags = heapq.nlargest(limit, tags.items(), key=lambda item: item[1][0])
+    names = await tagTable.names(tag for tag, _ in tags)
+    tagsList = []
+    
+    for tag, (value, margin) in tags:
+        tagsList.append(f"{names[tag]} ≈ {value} ± {margin}")
+        await asyncio.sleep(0)
+    
+    if tagsList:
+        return ", ".join(tagsList)
+    else:
+        return await locale_string_by_id("getstats-processing-result-no-tags", userId)
+
+
+async def create_tags_list(tags: typing.Dict[int, int], userId: int, limit: int=None) -> str:
+    '''
+    Returns tags ordered by number of posts, if limit is set,
+    only limit most frequent tags are selected with a heap
+
+    :param tags: { tag id: number of posts }, names are read
+        from tagTable only for the selected tags
+    '''
+    if limit is None:
+        tags = sorted(tags.items(), key=lambda item: item[1], reverse=True)
+    else:
+        tags = heapq.nlargest(limit, tags.items(), key=lambda item: item[1])
+    names = await tagTable.names(tag for tag, _ in tags)
     tagsList = []
     
-    for tag, value in tags.items():
-        tagsList.append(f"{tag} – {value}")
+    for tag, value in tags:
+        tagsList.append(f"{names[tag]} – {value}")
         await asyncio.sleep(0)
     
     if tagsList:
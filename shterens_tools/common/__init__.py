@@ -5,3 +5,16 @@ from .apis.mtprotoapi import *
 from .resources.mongodb import *
 from .resources.locales import *
 from .utils.progressbar import *
+from .stats.rollups import *
+from .stats.index import *
+from .stats.tags import *
+from .stats.filters import *
+from .stats.warehouse import *
+from .stats.accumulator import *
+from .stats.scanner import *
+from .stats.sampling import *
+from .stats.dates import *
+from .stats.results import *
+from .stats.live import *
+from .stats.cancellation import *
+from .stats.jobs import *
@@ -1,5 +1,6 @@
 from ..resources.config import config
 from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.middlewares import BaseMiddleware
 from aiogram_media_group import media_group_handler
 from aiogram import Bot, Dispatcher, executor, types
 from aiogram.contrib.fsm_storage.mongo import MongoStorage
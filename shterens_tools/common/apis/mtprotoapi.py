@@ -1,9 +1,13 @@
 import typing
+import asyncio
 import pyrogram
+from collections import OrderedDict, deque
 from pyrogram.enums import ChatType
+from .ratelimiter import FloodWaitLimiter
 from ..resources.config import config
 from pyrogram.errors import (
     FloodWait,
+    RPCError,
     NotAcceptable,
     UsernameNotOccupied,
     BadRequest as MTProtoAPIBadRequest
@@ -12,13 +16,44 @@ from pyrogram.errors import (
 apiId = config.getint("MTProtoAPI", "apiId")
 apiHash = config.get("MTProtoAPI", "apiHash")
 botToken = config.get("BotAPI", "botToken")
+requestsPerSecond = config.getfloat("MTProtoAPI", "requestsPerSecond", fallback=20.0)
 
-app = pyrogram.Client(
+if config.getboolean("MultipleInstances", "enable"):
+    instances = config.getint("MultipleInstances", "instances")
+else:
+    instances = 1
+
+#  Maximum number of message ids that can be requested with one get_messages call
+MESSAGES_WINDOW_SIZE = 200
+#  Number of windows requested in the background by iter_channel_posts
+MESSAGES_PREFETCH = 3
+
+mtprotoLimiter = FloodWaitLimiter(
+    rate=requestsPerSecond,
+    capacity=int(requestsPerSecond),
+    name=f"shterens_tools_{apiId}",
+    instances=instances
+)
+
+
+class MTProtoClient(pyrogram.Client):
+    '''
+    Modified pyrogram.Client, all requests of which go through
+    mtprotoLimiter shared by all instances
+
+    FloodWait is handled by the limiter, so sleep_threshold should be 0
+    '''
+    async def invoke(self, *args, **kwargs):
+        return await mtprotoLimiter.call(super().invoke, *args, **kwargs)
+
+
+app = MTProtoClient(
     "shterens_tools",
     api_id=apiId,
     api_hash=apiHash,
     bot_token=botToken,
-    in_memory=True
+    in_memory=True,
+    sleep_threshold=0
 )
 
 class MTProtoMessage(pyrogram.types.Message):
@@ -39,21 +74,157 @@ class MTProtoMessage(pyrogram.types.Message):
         return self.service
 
 
-async def get_post_messages(chatId: int, messageId: int) -> typing.List[pyrogram.types.Message]:
+class AlbumCache():
+    '''
+    Small cache of album members, so repeated requests for messages
+    of the same album don't call get_media_group again
+
+    :param chatAlbums: Number of albums stored per chat, the least
+        recently used album is dropped first
+    '''
+    def __init__(self, chatAlbums: int=32):
+        self.chatAlbums = chatAlbums
+        self._chats: typing.Dict[int | str, OrderedDict] = {}
+
+    def get(self, chatId: int | str, groupId: str) -> typing.List[pyrogram.types.Message] | None:
+        albums = self._chats.get(chatId)
+        
+        if albums is None or groupId not in albums:
+            return None
+        
+        albums.move_to_end(groupId)
+        return albums[groupId]
+
+    def put(self, chatId: int | str, album: typing.List[pyrogram.types.Message]):
+        albums = self._chats.setdefault(chatId, OrderedDict())
+        albums[album[0].media_group_id] = album
+        albums.move_to_end(album[0].media_group_id)
+        
+        if len(albums) > self.chatAlbums:
+            albums.popitem(last=False)
+
+
+albumCache = AlbumCache()
+
+
+async def get_post_messages(chatId: int | str, messageId: int) -> typing.List[pyrogram.types.Message]:
     '''
     Returns a message from a chat or the message group it belongs to
 
+    The message is requested once and the album is requested only
+    if the message has media_group_id and the album isn't cached
+
     :param chatId: Id of the chat in which the message was sent
     :param messageId: Message id
     '''
-    try:
-        post = await app.get_media_group(
+    message = await app.get_messages(
+        chat_id=chatId, 
+        message_ids=messageId
+    )
+
+    if message.empty or message.media_group_id is None:
+        return [message]
+    
+    album = albumCache.get(chatId, message.media_group_id)
+    
+    if album is None:
+        album = await app.get_media_group(
             chat_id=chatId, 
             message_id=messageId
         )
-    except ValueError:
-        post = await app.get_messages(
-            chat_id=chatId, 
-            message_ids=[messageId]
+        albumCache.put(chatId, album)
+    
+    return album
+
+
+async def get_messages_window(chatId: int, startId: int, endId: int) -> typing.List[pyrogram.types.Message]:
+    '''
+    Returns messages with ids from startId to endId inclusive using one request,
+    missing ids are returned as empty messages
+
+    :param chatId: Id of the chat in which the messages were sent
+    :param startId: First message id
+    :param endId: Last message id, window can't be larger than MESSAGES_WINDOW_SIZE
+    '''
+    return await app.get_messages(
+        chat_id=chatId,
+        message_ids=list(range(startId, endId+1))
+    )
+
+
+async def iter_channel_posts(
+    chatId: int,
+    startId: int,
+    endId: int,
+    windowSize: int=MESSAGES_WINDOW_SIZE,
+    prefetch: int=MESSAGES_PREFETCH,
+    onWindow: typing.Callable[[typing.List[pyrogram.types.Message]], typing.Awaitable[None]]=None
+) -> typing.AsyncIterator[typing.List[pyrogram.types.Message]]:
+    '''
+    Yields channel posts from startId to endId, where each post is a list
+    with a single message or with all messages of an album
+
+    Messages are requested in windows of windowSize ids, albums are rebuilt
+    locally by media_group_id, even if they are split between two windows.
+    Complete albums are saved to albumCache for get_post_messages()
+
+    Up to prefetch windows are requested in the background while the consumer
+    processes posts, the next window is requested only when the oldest
+    one is consumed, so memory usage is bounded
+
+    :param chatId: Id of the channel
+    :param startId: First message id
+    :param endId: Last message id
+    :param windowSize: Number of ids requested at once
+    :param prefetch: Number of windows requested at the same time
+    :param onWindow: Coroutine function called with messages of every window
+        before its posts are yielded, e.g. to process them in one batch
+    '''
+    album = []
+    firstId = startId
+    windows: typing.Deque[asyncio.Task] = deque()
+
+    def request_window():
+        nonlocal startId
+        windowEnd = min(startId + windowSize - 1, endId)
+        windows.append(
+            asyncio.create_task(get_messages_window(chatId, startId, windowEnd))
         )
-    return post
+        startId = windowEnd + 1
+
+    try:
+        while startId <= endId and len(windows) < prefetch:
+            request_window()
+
+        while windows:
+            messages = await windows.popleft()
+            
+            if startId <= endId:
+                request_window()
+
+            if onWindow is not None:
+                await onWindow(messages)
+            
+            for message in messages:
+                groupId = message.media_group_id
+
+                if album and album[0].media_group_id != groupId:
+                    #  The first album may have started before the range
+                    if album[0].id != firstId:
+                        albumCache.put(chatId, album)
+                    yield album
+                    album = []
+                
+                if groupId is None:
+                    yield [message]
+                else:
+                    album.append(message)
+        
+        if album:
+            yield album
+    
+    finally:
+        #  Consumer has stopped the iteration or an error occurred
+        for window in windows:
+            window.cancel()
+        await asyncio.gather(*windows, return_exceptions=True)
@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+import struct
+import typing
+import asyncio
+import tempfile
+import contextlib
+from multiprocessing import shared_memory, resource_tracker
+from pyrogram.errors import FloodWait
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+class FloodWaitLimiter():
+    '''
+    Token bucket rate limiter that adapts to FloodWait errors
+
+    The rate and the time until which requests are blocked are stored
+    in a shared memory block, so if one process gets FloodWait,
+    all processes with the same block name slow down together.
+    The block is changed under a file lock, so changes of
+    different processes aren't lost
+
+    The block outlives the processes, so the process starting the others
+    calls reset() on startup and unlink() on shutdown
+
+    :param rate: Maximum number of requests per second for all processes
+    :param capacity: Maximum number of requests sent at once by one process
+    :param name: Shared memory block name, if None, state is not shared
+    :param instances: Number of processes sharing the rate
+    :param minRate: Rate can't be decreased below this value
+    :param recovery: Rate increase after each successful request
+    :param attempts: Number of attempts of a request, then FloodWait is raised
+
+    On FloodWait the rate is halved, then it slowly recovers
+    '''
+    _layout = struct.Struct("dd")
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int,
+        name: str=None,
+        instances: int=1,
+        minRate: float=1.0,
+        recovery: float=0.05,
+        attempts: int=5
+    ):
+        self.maxRate = rate
+        self.capacity = capacity
+        self.instances = instances
+        self.minRate = minRate
+        self.recovery = recovery
+        self.attempts = attempts
+
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._memory, created = self._attach(name)
+        self._lockFile = None
+
+        if isinstance(self._memory, shared_memory.SharedMemory):
+            self._lockFile = open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "a+b")
+
+        if created:
+            self.reset()
+
+    def _attach(self, name: str | None) -> typing.Tuple[shared_memory.SharedMemory | bytearray, bool]:
+        '''
+        Creates shared memory block or attaches to the existing one,
+        if shared memory is unavailable, local buffer is used
+        '''
+        if name is None:
+            return bytearray(self._layout.size), True
+
+        try:
+            try:
+                memory = shared_memory.SharedMemory(name=name, create=True, size=self._layout.size)
+                created = True
+            except FileExistsError:
+                memory = shared_memory.SharedMemory(name=name)
+                created = False
+        except OSError:
+            return bytearray(self._layout.size), True
+
+        #  Block is shared by independent processes, so the resource tracker
+        #  must not remove it when one of them exits
+        try:
+            resource_tracker.unregister(memory._name, "shared_memory")
+        except (AttributeError, KeyError):
+            pass
+
+        return memory, created
+
+    @contextlib.contextmanager
+    def _locked(self):
+        '''
+        Holds the lock of the block shared with other processes,
+        the lock is held only between reading and writing the block,
+        so nothing is awaited under it
+        '''
+        if self._lockFile is None:
+            yield
+            return
+
+        if sys.platform == "win32":
+            self._lockFile.seek(0)
+            msvcrt.locking(self._lockFile.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(self._lockFile.fileno(), fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                self._lockFile.seek(0)
+                msvcrt.locking(self._lockFile.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._lockFile.fileno(), fcntl.LOCK_UN)
+
+    def reset(self):
+        '''
+        Sets the maximum rate and unblocks requests, so a rate decreased
+        before the restart or with other settings isn't used
+        '''
+        with self._locked():
+            self._write(self.maxRate, 0.0)
+
+    def unlink(self):
+        '''
+        Removes the shared memory block, called when all processes
+        using it have stopped
+        '''
+        if not isinstance(self._memory, shared_memory.SharedMemory):
+            return
+
+        #  unlink() unregisters the block from the resource tracker
+        if sys.platform != "win32":
+            resource_tracker.register(self._memory._name, "shared_memory")
+
+        self._memory.close()
+        try:
+            self._memory.unlink()
+        except FileNotFoundError:
+            pass
+
+        self._memory = bytearray(self._layout.size)
+        self._lockFile.close()
+        self._lockFile = None
+        self.reset()
+
+    def _read(self) -> typing.Tuple[float, float]:
+        buffer = self._memory if isinstance(self._memory, bytearray) else self._memory.buf
+        return self._layout.unpack_from(buffer)
+
+    def _write(self, rate: float, blockedUntil: float):
+        buffer = self._memory if isinstance(self._memory, bytearray) else self._memory.buf
+        self._layout.pack_into(buffer, 0, rate, blockedUntil)
+
+    async def acquire(self):
+        '''
+        Waits until a request can be sent
+        '''
+        while True:
+            with self._locked():
+                rate, blockedUntil = self._read()
+            now = time.time()
+
+            if blockedUntil > now:
+                await asyncio.sleep(blockedUntil - now)
+                continue
+
+            processRate = max(rate, self.minRate) / self.instances
+            monotonic = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (monotonic - self._updated) * processRate)
+            self._updated = monotonic
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) / processRate)
+
+    def flood_wait(self, seconds: float):
+        '''
+        Blocks requests of all processes for seconds and halves the rate
+        '''
+        with self._locked():
+            rate, blockedUntil = self._read()
+            self._write(
+                max(self.minRate, rate / 2),
+                max(blockedUntil, time.time() + seconds)
+            )
+        self._tokens = 0.0
+
+    def success(self):
+        #  Rate is usually not decreased, so the lock isn't taken
+        if self._read()[0] >= self.maxRate:
+            return
+
+        with self._locked():
+            rate, blockedUntil = self._read()
+            if rate < self.maxRate:
+                self._write(min(self.maxRate, rate + self.recovery), blockedUntil)
+
+    async def call(self, method: typing.Callable[..., typing.Awaitable], *args, **kwargs) -> typing.Any:
+        '''
+        Calls method when the rate allows it, retries on FloodWait
+        at most attempts times, arguments are passed to the method
+
+        :param method: Coroutine function sending the request
+        '''
+        for attempt in range(self.attempts):
+            await self.acquire()
+
+            try:
+                result = await method(*args, **kwargs)
+            except FloodWait as e:
+                self.flood_wait(e.value)
+                error = e
+            else:
+                self.success()
+                return result
+
+        raise error
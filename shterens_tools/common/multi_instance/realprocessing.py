@@ -12,8 +12,10 @@ import typing
 import signal
 import inspect
 import asyncio
+import threading
 import subprocess
 from .network import ExManager
+from collections import deque
 from multiprocessing import get_context
 from multiprocessing.queues import Queue
 from ..utils.regex import uuid_to_varname, oneliner_to_multiliner
@@ -417,6 +419,44 @@ class RealEvent():
             time.sleep(1)
 
 
+class RealLog():
+    '''
+    Bounded log of objects, every reader keeps its own position
+    and reads objects appended since it
+
+    :param size: Number of objects stored, the oldest object is dropped first
+    '''
+    def __init__(self, size: int=10000):
+        self._objects = deque(maxlen=size)
+        self._end = 0
+        #  Every connected process is served in its own thread
+        self._lock = threading.Lock()
+
+    def append(self, obj):
+        with self._lock:
+            self._objects.append(obj)
+            self._end += 1
+
+    def end(self) -> int:
+        '''
+        Returns position after the last appended object
+        '''
+        return self._end
+
+    def read(self, position: int) -> typing.Tuple[int, typing.List[typing.Any] | None]:
+        '''
+        Returns new position and objects appended since the position,
+        objects are None if some of them are already dropped
+        '''
+        with self._lock:
+            missed = self._end - position
+
+            if missed > len(self._objects):
+                return self._end, None
+
+            return self._end, list(self._objects)[len(self._objects)-missed:]
+
+
 class ExQueue(Queue):
     '''
     Extended multiprocessing.Queue
@@ -13,6 +13,14 @@ def generate_config(configPath):
     config.add_section("MTProtoAPI")
     config.set("MTProtoAPI", "apiId", "None")
     config.set("MTProtoAPI", "apiHash", "None")
+    config.set("MTProtoAPI", "requestsPerSecond", "20")
+
+    config.add_section("MongoDB")
+    config.set("MongoDB", "uri", "mongodb://localhost:27017")
+    config.set("MongoDB", "maxPoolSize", "100")
+    config.set("MongoDB", "minPoolSize", "0")
+    config.set("MongoDB", "connectTimeoutMS", "20000")
+    config.set("MongoDB", "serverSelectionTimeoutMS", "30000")
 
     config.add_section("MultipleInstances")
     config.set("MultipleInstances", "enable", "False")
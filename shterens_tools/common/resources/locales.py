@@ -319,42 +319,54 @@ locales = {
             "Forward the message which will be the beginning of the range or use the default value"\
             """
         
-            If the message is not forwarded on behalf of your channel, send a link to it"""),
+            If the message is not forwarded on behalf of your channel, send a link to it
+
+            Or send the date of the first post in the format DD.MM.YYYY"""),
 
         "es": inspect.cleandoc("\
             [ 3 ] : Definamos el rango de mensajes que se contabilizarán en las estadísticas. "\
             "Reenvíe el mensaje que será el inicio del rango o utilice el valor por defecto"\
             """
         
-            Si el mensaje no se reenvía en nombre de su canal, envíe un enlace al mismo"""),
+            Si el mensaje no se reenvía en nombre de su canal, envíe un enlace al mismo
+
+            O envíe la fecha del primer mensaje en el formato DD.MM.AAAA"""),
 
         "fr": inspect.cleandoc("\
             [ 3 ] : Définissons la plage de messages qui seront comptabilisés dans les statistiques. "\
             "Faites suivre le message qui sera le début de la plage ou utilisez la valeur par défaut"\
             """
         
-            Si le message n'est pas transféré au nom de votre canal, envoyez un lien vers celui-ci"""),
+            Si le message n'est pas transféré au nom de votre canal, envoyez un lien vers celui-ci
+
+            Ou envoyez la date du premier message au format JJ.MM.AAAA"""),
 
         "pt": inspect.cleandoc("\
             [ 3 ] : Vamos definir o intervalo de mensagens que serão contadas nas estatísticas. "\
             "Encaminhar a mensagem que será o início do intervalo ou utilizar o valor por defeito"\
             """
         
-            Se a mensagem não for enviada em nome do seu canal, envie um link para o mesmo"""),
+            Se a mensagem não for enviada em nome do seu canal, envie um link para o mesmo
+
+            Ou envie a data da primeira mensagem no formato DD.MM.AAAA"""),
 
         "ru": inspect.cleandoc("\
             [ 3 ] : Давайте определим диапазон сообщений, которые будут учитываться в статистике. "\
             "Перешлите сообщение, которое будет началом промежутка или используйте значение по умолчанию"\
             """
         
-            Если сообщение не пересылается от имени вашего канала, отправьте ссылку на него"""),
+            Если сообщение не пересылается от имени вашего канала, отправьте ссылку на него
+
+            Или отправьте дату первого сообщения в формате ДД.ММ.ГГГГ"""),
 
         "zh": inspect.cleandoc("\
             [ 3 ] ：让我们定义将被计入统计的信息范围。 "\
             "转发将是该范围的开始的消息或使用默认值"\
             """
         
-            如果该消息不是代表你的频道转发的，请发送一个链接。""")
+            如果该消息不是代表你的频道转发的，请发送一个链接。
+
+            或以 DD.MM.YYYY 格式发送第一条信息的日期""")
     },
     "getstats-range-start-default-button":
     {
@@ -370,32 +382,44 @@ locales = {
         "en": inspect.cleandoc("""
             Forward the last message, which will be counted in the statistics
         
-            If the message is not forwarded on behalf of your channel, send a link to it"""),
+            If the message is not forwarded on behalf of your channel, send a link to it
+
+            Or send the date of the last post in the format DD.MM.YYYY"""),
 
         "es": inspect.cleandoc("""
             Reenviar el último mensaje, que se contabilizará en las estadísticas
         
-            Si el mensaje no se reenvía en nombre de su canal, envíe un enlace al mismo"""),
+            Si el mensaje no se reenvía en nombre de su canal, envíe un enlace al mismo
+
+            O envíe la fecha del último mensaje en el formato DD.MM.AAAA"""),
 
         "fr": inspect.cleandoc("""
             Transférer le dernier message, qui sera comptabilisé dans les statistiques
 
-            Si le message n'est pas transféré au nom de votre canal, envoyez un lien vers celui-ci"""),
+            Si le message n'est pas transféré au nom de votre canal, envoyez un lien vers celui-ci
+
+            Ou envoyez la date du dernier message au format JJ.MM.AAAA"""),
 
         "pt": inspect.cleandoc("""
             Encaminhar a última mensagem, que será contada nas estatísticas
 
-            Se a mensagem não for enviada em nome do seu canal, envie um link para o mesmo"""),
+            Se a mensagem não for enviada em nome do seu canal, envie um link para o mesmo
+
+            Ou envie a data da última mensagem no formato DD.MM.AAAA"""),
 
         "ru": inspect.cleandoc("""
             Перешлите последнее сообщение, которое будет учитываться в статистике
         
-            Если сообщение не пересылается от имени вашего канала, отправьте ссылку на него"""),
+            Если сообщение не пересылается от имени вашего канала, отправьте ссылку на него
+
+            Или отправьте дату последнего сообщения в формате ДД.ММ.ГГГГ"""),
 
         "zh": inspect.cleandoc("""
             转发最后一条信息，这将被计入统计中
 
-            如果消息没有代表你的频道转发，请发送一个链接给它""")
+            如果消息没有代表你的频道转发，请发送一个链接给它
+
+            或以 DD.MM.YYYY 格式发送最后一条信息的日期""")
     },
     "getstats-message-range-end-error":
     {
@@ -406,6 +430,15 @@ locales = {
         "ru": "Последнее сообщение не может быть после первого",
         "zh": "最后一条信息不能在第一条之后"
     },
+    "getstats-message-range-date-error":
+    {
+        "en": "There are no posts after this date",
+        "es": "No hay mensajes después de esta fecha",
+        "fr": "Il n'y a pas de messages après cette date",
+        "pt": "Não há postos depois desta data",
+        "ru": "После этой даты нет публикаций",
+        "zh": "此日期之后没有帖子"
+    },
     "getstats-message-range-error":
     {
         "en": "Not the message of the selected channel",
@@ -543,6 +576,24 @@ locales = {
         "ru": "<b>[ Долгое ожидание ] : </b>Не удается получить ответ от серверов Telegram, попробуйте позже",
         "zh": "<b>[ 漫长的等待 ] : </b>无法从Telegram服务器获得响应，请稍后再试。"
     },
+    "getstats-processing-error":
+    {
+        "en": "<b>[ Error ] : </b>Statistics couldn't be collected, please try again later",
+        "es": "<b>[ Error ] : </b>No se pudieron recopilar las estadísticas, intente nuevamente más tarde",
+        "fr": "<b>[ Erreur ] : </b>Les statistiques n'ont pas pu être collectées, veuillez réessayer plus tard",
+        "pt": "<b>[ Erro ] : </b>Não foi possível coletar as estatísticas, por favor tente novamente mais tarde",
+        "ru": "<b>[ Ошибка ] : </b>Не удалось собрать статистику, попробуйте позже",
+        "zh": "<b>[ 错误 ] : </b>无法收集统计信息，请稍后再试"
+    },
+    "getstats-processing-result-no-posts":
+    {
+        "en": "📊 <b>Channel «{}»</b>\n\nNo posts found in the range",
+        "es": "📊 <b>Canal «{}»</b>\n\nNo se encontraron publicaciones en el rango",
+        "fr": "📊 <b>Chaîne «{}»</b>\n\nAucun message trouvé dans la plage",
+        "pt": "📊 <b>Canal «{}»</b>\n\nNenhuma publicação encontrada no intervalo",
+        "ru": "📊 <b>Канал «{}»</b>\n\nВ диапазоне не найдено постов",
+        "zh": "📊 <b>频道 «{}»</b>\n\n在范围内没有找到帖子"
+    },
     "getstats-processing-result":
     {
         "en": inspect.cleandoc("""
@@ -607,6 +658,71 @@ locales = {
             第一个帖子 ({})
             频道中的帖子数 {} <i>({})</i>""")
     },
+    "getstats-sampling-result":
+    {
+        "en": inspect.cleandoc("""
+            📊 <b>Channel «{}»</b> <i>(estimate)</i>
+            => [ {} – {} ]
+            number of posts ≈ {} ± {} <i>({})</i>
+            <i>{} of {} ids sampled, 95% confidence intervals</i>"""),
+
+        "es": inspect.cleandoc("""
+            📊 <b>Canal «{}»</b> <i>(estimación)</i>
+            => [ {} – {} ]
+            número de mensajes ≈ {} ± {} <i>({})</i>
+            <i>{} de {} ids muestreados, intervalos de confianza del 95%</i>"""),
+
+        "fr": inspect.cleandoc("""
+            📊 <b>Canal «{}»</b> <i>(estimation)</i>
+            => [ {} – {} ]
+            nombre de messages ≈ {} ± {} <i>({})</i>
+            <i>{} sur {} ids échantillonnés, intervalles de confiance à 95%</i>"""),
+
+        "pt": inspect.cleandoc("""
+            📊 <b>Canal «{}»</b> <i>(estimativa)</i>
+            => [ {} – {} ]
+            número de postos ≈ {} ± {} <i>({})</i>
+            <i>{} de {} ids amostrados, intervalos de confiança de 95%</i>"""),
+
+        "ru": inspect.cleandoc("""
+            📊 <b>Канал «{}»</b> <i>(оценка)</i>
+            => [ {} – {} ]
+            количество публикаций ≈ {} ± {} <i>({})</i>
+            <i>проверено {} из {} id, доверительные интервалы 95%</i>"""),
+
+        "zh": inspect.cleandoc("""
+            📊 <b>频道 «{}»</b> <i>(估计)</i>
+            => [ {} – {} ]
+            帖子数量 ≈ {} ± {} <i>({})</i>
+            <i>抽样 {} / {} 个 id，95% 置信区间</i>""")
+    },
+    "getstats-processing-result-approximate":
+    {
+        "en": "<i>approximate top {} tags, counts may be overestimated by up to {}</i>",
+        "es": "<i>top {} aproximado de hashtags, los recuentos pueden estar sobreestimados hasta en {}</i>",
+        "fr": "<i>top {} approximatif des tags, les nombres peuvent être surestimés jusqu'à {}</i>",
+        "pt": "<i>top {} aproximado de etiquetas, as contagens podem ser sobrestimadas até {}</i>",
+        "ru": "<i>приблизительный топ {} тегов, количество может быть завышено не более чем на {}</i>",
+        "zh": "<i>近似的前 {} 个标签，数量最多可能高估 {}</i>"
+    },
+    "getstats-processing-result-histogram":
+    {
+        "en": "<b>Posts per day</b>\n{}",
+        "es": "<b>Publicaciones por día</b>\n{}",
+        "fr": "<b>Publications par jour</b>\n{}",
+        "pt": "<b>Publicações por dia</b>\n{}",
+        "ru": "<b>Посты по дням</b>\n{}",
+        "zh": "<b>每日帖子</b>\n{}"
+    },
+    "getstats-processing-result-trend":
+    {
+        "en": "<b>Trend</b>\n{}",
+        "es": "<b>Tendencia</b>\n{}",
+        "fr": "<b>Tendance</b>\n{}",
+        "pt": "<b>Tendência</b>\n{}",
+        "ru": "<b>Динамика</b>\n{}",
+        "zh": "<b>趋势</b>\n{}"
+    },
     "getstats-processing-result-no-tags":
     {
         "en": "no tags found",
@@ -1,50 +1,360 @@
+import os
+import time
 import typing
 import asyncio
+import contextvars
+from collections import OrderedDict
 from .logs import *
+from .config import config
 from ..apis.botapi import *
 from motor import motor_asyncio
-from pymongo.errors import OperationFailure
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import OperationFailure, BulkWriteError, PyMongoError
 
-mongoClient = None
-shterensToolsDB = None
-usersCollection = None
+if typing.TYPE_CHECKING:
+    from ..multi_instance.realprocessing import RealLog
 
+mongoUri = config.get("MongoDB", "uri", fallback="mongodb://localhost:27017")
+#  Connections are opened on the first request, so importing the package
+#  does no I/O and child processes don't inherit sockets
+mongoClient = motor_asyncio.AsyncIOMotorClient(
+    mongoUri,
+    maxPoolSize=config.getint("MongoDB", "maxPoolSize", fallback=100),
+    minPoolSize=config.getint("MongoDB", "minPoolSize", fallback=0),
+    connectTimeoutMS=config.getint("MongoDB", "connectTimeoutMS", fallback=20000),
+    serverSelectionTimeoutMS=config.getint("MongoDB", "serverSelectionTimeoutMS", fallback=30000),
+    connect=False
+)
 
-async def init_db(
-) -> typing.Tuple[motor_asyncio.AsyncIOMotorClient,
-                  motor_asyncio.AsyncIOMotorDatabase,
-                  motor_asyncio.AsyncIOMotorCollection]:
+shterensToolsDB = mongoClient.shterens_tools
+usersCollection = shterensToolsDB.users
+channelsIndexCollection = shterensToolsDB.channels_index
+postsIndexCollection = shterensToolsDB.posts_index
+jobsCollection = shterensToolsDB.jobs
+tagsCollection = shterensToolsDB.tags
+countersCollection = shterensToolsDB.counters
+rollupsCollection = shterensToolsDB.rollups
+
+#  Number of user documents kept in the cache
+USER_CACHE_SIZE = 10000
+#  Seconds after which a cached user is read again
+USER_CACHE_TTL = 300
+#  Fields of the user document read by the bot
+USER_PROJECTION = { "language": 1 }
+#  Number of changed users that triggers a write of the buffer
+USER_WRITE_BATCH_SIZE = 500
+#  Seconds during which user changes are buffered before a write
+USER_WRITE_INTERVAL = 1.0
+#  Seconds between reads of users changed by other instances,
+#  see listen_user_changes()
+USER_CHANGES_INTERVAL = 1.0
+#  Seconds after which finished jobs and their results are deleted
+FINISHED_JOBS_TTL = 7 * 24 * 60 * 60
+
+#  Indexes created by init_db(), { collection: [ index ] },
+#  the users and channels index are read only by _id
+COLLECTION_INDEXES: typing.Dict[str, typing.List[IndexModel]] = {
+    "posts_index": [
+        #  Indexed posts are always requested by channel and message id range
+        IndexModel([("chat", 1), ("id", 1)], unique=True),
+        #  Parts of albums are found by media group
+        IndexModel([("chat", 1), ("group", 1)]),
+        #  Rollups are counted from posts of the changed days
+        IndexModel([("chat", 1), ("date", 1)])
+    ],
+    "tags": [
+        #  Tag ids are looked up by tag
+        IndexModel("tag", unique=True)
+    ],
+    "rollups": [
+        IndexModel([("chat", 1), ("period", 1), ("bucket", 1)], unique=True)
+    ],
+    "jobs": [
+        #  Queued jobs and jobs with expired lease are claimed by all instances
+        IndexModel([("status", 1), ("kind", 1), ("leaseUntil", 1)]),
+        IndexModel([("user", 1), ("status", 1)]),
+        IndexModel([("owner", 1), ("status", 1)]),
+        #  Child jobs are found by parent, which is stored as None for other jobs
+        IndexModel("parent"),
+        IndexModel("finished", expireAfterSeconds=FINISHED_JOBS_TTL)
+    ]
+}
+
+_dbInitialized = False
+
+
+async def init_db():
     '''
-    Gets shterens_tools database, in which creates users collection
+    Creates indexes of the shterens_tools collections, see COLLECTION_INDEXES,
+    collections themselves are created by MongoDB on the first write
+
+    Called in the startup hook of every instance,
+    repeated calls do nothing
 
     '''
-    mongoClient: motor_asyncio.AsyncIOMotorClient = motor_asyncio.AsyncIOMotorClient("mongodb://localhost:27017")
-    #  Patch get_io_loop to avoid conflicts with multiple event loops
-    mongoClient.get_io_loop = asyncio.get_running_loop
-    
-    if "shterens_tools" not in await mongoClient.list_database_names():
-        mongoClient.get_database("shterens_tools")
+    global _dbInitialized
 
-    shterensToolsDB: motor_asyncio.AsyncIOMotorDatabase = mongoClient.shterens_tools
+    if _dbInitialized:
+        return
     
-    try:
-        if "users" not in await shterensToolsDB.list_collection_names():
-            await shterensToolsDB.create_collection("users")
-    except OperationFailure:
-        pass
+    for collection, indexes in COLLECTION_INDEXES.items():
+        try:
+            await shterensToolsDB[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            #  Index with the same keys and other options exists,
+            #  it has to be dropped manually to be changed
+            logger.warning(f"MongoDB : Indexes of {collection} aren't created : {e}")
+
+    _dbInitialized = True
+
+
+class UserCache():
+    '''
+    LRU cache of user documents with TTL
+
+    Users are changed only with add_user() and set_lang(),
+    which update the cache when the change is buffered, see UserWriteBuffer.
+    Users changed by other instances are dropped, see listen_user_changes()
+
+    :param size: Number of users stored, the least recently used
+        user is dropped first
+    :param ttl: Seconds after which a user is read again
+    '''
+    def __init__(self, size: int=USER_CACHE_SIZE, ttl: float=USER_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        #  Incremented when users are dropped, so users read
+        #  before that aren't cached, see user_by_id()
+        self.generation = 0
+
+        self._users: OrderedDict[int, typing.Tuple[float, dict]] = OrderedDict()
+
+    def get(self, id: int) -> dict | None:
+        if id in self._users:
+            expires, user = self._users[id]
+
+            if expires >= time.monotonic():
+                self._users.move_to_end(id)
+                self.hits += 1
+                return user
+
+            self._users.pop(id)
+
+        self.misses += 1
+        return None
+
+    def put(self, id: int, user: dict):
+        self._users[id] = (time.monotonic() + self.ttl, user)
+        self._users.move_to_end(id)
+
+        if len(self._users) > self.size:
+            self._users.popitem(last=False)
+
+    def update(self, id: int, fields: dict):
+        '''
+        Sets fields of the cached user, if it's not cached,
+        it will be read on the next request
+        '''
+        if id in self._users:
+            self._users[id][1].update(fields)
+
+    def invalidate(self, ids: typing.Iterable[int]):
+        '''
+        Drops users, they will be read on the next request
+        '''
+        self.generation += 1
+        for id in ids:
+            self._users.pop(id, None)
+
+    def clear(self):
+        self.generation += 1
+        self._users.clear()
+
+    @property
+    def hitRate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+
+class UserWriteBuffer():
+    '''
+    Write-behind buffer of user changes
+
+    Changes of the same user are merged into one upsert and the buffer
+    is written with one unordered bulk write, when batchSize users are
+    changed or interval seconds after the first change. user_by_id()
+    applies buffered changes, so users see them before they're saved
+
+    Ids of the written users are appended to changes, if it's set,
+    so other instances drop them from their caches
+
+    :param batchSize: Number of changed users that triggers a write
+    :param interval: Seconds after which buffered changes are written
+    '''
+    def __init__(self, batchSize: int=USER_WRITE_BATCH_SIZE, interval: float=USER_WRITE_INTERVAL):
+        self.batchSize = batchSize
+        self.interval = interval
+
+        #  { id: ( inserted document or None, fields set ) }
+        self._changes: typing.Dict[int, typing.Tuple[dict | None, dict]] = {}
+        self._timer: asyncio.Task | None = None
+        #  Running timers and writes, awaited by stop()
+        self._tasks: typing.Set[asyncio.Task] = set()
+        #  ( instance pid, user ids ) written by every instance
+        self.changes: "RealLog" = None
+
+    def insert(self, id: int, user: dict):
+        _, fields = self._changes.get(id, (None, {}))
+        self._changes[id] = (user, fields)
+        self._schedule()
+
+    def set(self, id: int, fields: dict):
+        inserted, changed = self._changes.get(id, (None, {}))
+        self._changes[id] = (inserted, {**changed, **fields})
+        self._schedule()
 
-    usersCollection: motor_asyncio.AsyncIOMotorCollection = shterensToolsDB.users
+    def apply(self, id: int, user: dict | None) -> dict | None:
+        '''
+        Returns user read from the database with the buffered changes
+        '''
+        if id not in self._changes:
+            return user
 
-    return mongoClient, shterensToolsDB, usersCollection
+        inserted, fields = self._changes[id]
+
+        if user is None:
+            if inserted is None:
+                return None
+            user = dict(inserted)
+
+        user.update(fields)
+        return user
+
+    async def flush(self):
+        '''
+        Writes buffered changes, if the database is unavailable,
+        changes are buffered again and written later
+        '''
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        changes, self._changes = self._changes, {}
+        if not changes:
+            return
+
+        requests = []
+
+        for id, (inserted, fields) in changes.items():
+            update = {}
+            if fields:
+                update["$set"] = fields
+            onInsert = {
+                field: value for field, value in (inserted or {}).items()
+                if field != "_id" and field not in fields
+            }
+            if onInsert:
+                update["$setOnInsert"] = onInsert
+            requests.append(UpdateOne({ "_id": id }, update, upsert=inserted is not None))
+
+        try:
+            await usersCollection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            #  Invalid changes are dropped, the rest are written
+            errors.error(f"MongoDB : {len(e.details['writeErrors'])} user changes aren't written : {e.details['writeErrors'][:3]}")
+        except PyMongoError as e:
+            errors.error(f"MongoDB : {len(changes)} user changes are buffered again : {e}")
+            self._restore(changes)
+            return
+
+        if self.changes is not None:
+            try:
+                await asyncio.to_thread(self.changes.append, (os.getpid(), list(changes)))
+            except (OSError, EOFError) as e:
+                errors.error(f"MongoDB : Changes of {len(changes)} users aren't sent to other instances : {e}")
+
+    async def stop(self):
+        '''
+        Writes buffered changes and waits for the running writes
+        '''
+        await self.flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _restore(self, changes: typing.Dict[int, typing.Tuple[dict | None, dict]]):
+        #  Changes made during the write are newer
+        for id, (inserted, fields) in changes.items():
+            newInserted, newFields = self._changes.get(id, (None, {}))
+            self._changes[id] = (newInserted or inserted, {**fields, **newFields})
+        self._schedule()
+
+    def _schedule(self):
+        if len(self._changes) >= self.batchSize:
+            self._start(self.flush())
+        elif self._timer is None:
+            self._timer = self._start(self._flush_later())
+
+    def _start(self, coroutine: typing.Awaitable) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        self._timer = None
+        await self.flush()
+
+
+userCache = UserCache()
+userWrites = UserWriteBuffer()
+_userChangesTask: asyncio.Task | None = None
+#  User who sent the update being processed, see UserContextMiddleware
+currentUser: contextvars.ContextVar[dict | None] = contextvars.ContextVar("currentUser", default=None)
+
+
+class UserContextMiddleware(BaseMiddleware):
+    '''
+    Loads the user who sent the update once before handlers are called,
+    user_by_id() and locale helpers return it without reading the database
+
+    Updates without a user, like channel posts, aren't read
+    '''
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        currentUser.set(None)
+
+        for event in (update.message, update.edited_message, update.callback_query, update.my_chat_member):
+            if event is not None and event.from_user is not None:
+                currentUser.set(await user_by_id(event.from_user.id))
+                break
 
 
 async def add_user(id: types.base.Integer):
     logger.info(f"/start : New user with id {id} added")
-    await usersCollection.insert_one({ "_id": id, "language": "en", "channels": [] })
+    user = { "_id": id, "language": "en", "channels": [] }
+    userWrites.insert(id, user)
+    userCache.put(id, user)
+    currentUser.set(user)
 
 
 async def user_by_id(id: types.base.Integer) -> dict:
-    return await usersCollection.find_one({ "_id": id })
+    user = currentUser.get()
+    if user is not None and user["_id"] == id:
+        return user
+
+    user = userCache.get(id)
+
+    if user is None:
+        generation = userCache.generation
+        user = await usersCollection.find_one({ "_id": id }, USER_PROJECTION)
+        user = userWrites.apply(id, user)
+        #  New users aren't cached, add_user() caches them, the user
+        #  could be changed by another instance during the read
+        if user is not None and generation == userCache.generation:
+            userCache.put(id, user)
+
+    return user
 
 
 async def lang_by_id(id: types.base.Integer) -> str:
@@ -52,10 +362,45 @@ async def lang_by_id(id: types.base.Integer) -> str:
 
 
 async def set_lang(id: types.base.Integer, lang: str):
-    await usersCollection.update_one({ "_id": id }, { "$set": { "language": lang }})
+    userWrites.set(id, { "language": lang })
+    userCache.update(id, { "language": lang })
+
+    user = currentUser.get()
+    if user is not None and user["_id"] == id:
+        user["language"] = lang
+
+
+def listen_user_changes(changes: "RealLog", interval: float=USER_CHANGES_INTERVAL):
+    '''
+    Shares user changes with other instances through the log created in
+    ExManager, written users are appended to it and users written by other
+    instances are dropped from userCache every interval seconds
+
+    Called in the startup hook of every instance
+    '''
+    global _userChangesTask
+
+    userWrites.changes = changes
+    _userChangesTask = asyncio.get_running_loop().create_task(
+        _read_user_changes(changes, changes.end(), interval)
+    )
+
+
+async def _read_user_changes(changes: "RealLog", position: int, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            position, written = await asyncio.to_thread(changes.read, position)
+        except (OSError, EOFError) as e:
+            errors.error(f"MongoDB : Changed users aren't read : {e}")
+            continue
 
+        #  Too many users are changed since the last read
+        if written is None:
+            userCache.clear()
+            continue
 
-#  This event loop is for mongodb init only, so it can be safely closed
-loop = asyncio.new_event_loop()
-mongoClient, shterensToolsDB, usersCollection = loop.run_until_complete(init_db())
-loop.close()
+        for instance, ids in written:
+            if instance != os.getpid():
+                userCache.invalidate(ids)
@@ -6,5 +6,9 @@ def get_root_path() -> str:
 def get_bot_folder_path() -> str:
     return os.path.join(get_root_path(), "shterens_tools")
 
+def get_warehouse_path() -> str:
+    return os.path.join(get_root_path(), "warehouse")
+
 rootPath = get_root_path()
 botFolderPath = get_bot_folder_path()
+warehousePath = get_warehouse_path()
@@ -0,0 +1,227 @@
+import typing
+import datetime
+from array import array
+from .heavyhitters import *
+
+
+class StatsAccumulator():
+    '''
+    Compact stats of the scanned posts
+
+    Only the first and last post ids, the number of posts and their dates
+    are kept with { tag id: number of posts } for tag ids from tagTable
+
+    :param histogram: Count posts per day
+    :param keepPosts: Keep ids and timestamps of all counted posts
+        in array('q') buffers for analytics that need per-post data
+    :param topK: Count only approximately topK most frequent tags
+        in a fixed number of counters, see SpaceSaving
+    '''
+    __slots__ = (
+        "first",
+        "last",
+        "count",
+        "firstDate",
+        "lastDate",
+        "days",
+        "histogram",
+        "postIds",
+        "postDates",
+        "topK",
+        "heavyHitters",
+        "_tagCounts"
+    )
+
+    def __init__(self, histogram: bool=False, keepPosts: bool=False, topK: int=None):
+        self.first: int = None
+        self.last: int = None
+        self.count = 0
+        self.firstDate: datetime.datetime = None
+        self.lastDate: datetime.datetime = None
+        self.histogram = histogram
+        #  { "YYYY-MM-DD": number of posts }
+        self.days: typing.Dict[str, int] = {}
+
+        self.postIds: array | None = array("q") if keepPosts else None
+        self.postDates: array | None = array("q") if keepPosts else None
+
+        self._tagCounts: typing.Dict[int, int] = {}
+
+        self.topK = topK
+        self.heavyHitters: SpaceSaving | None = None
+        if topK:
+            self.heavyHitters = SpaceSaving(topK * HEAVY_HITTERS_FACTOR)
+
+    def count_tag(self, tag: int, value: int=1):
+        if self.heavyHitters is not None:
+            self.heavyHitters.add(tag, value)
+        else:
+            self._tagCounts[tag] = self._tagCounts.get(tag, 0) + value
+
+    def add_post(self, messageId: int, tags: typing.Iterable[int], date: datetime.datetime):
+        if not self.count:
+            self.first = messageId
+            self.firstDate = date
+
+        self.last = messageId
+        self.lastDate = date
+        self.count += 1
+
+        for tag in tags:
+            self.count_tag(tag)
+
+        if self.histogram:
+            day = date.strftime("%Y-%m-%d")
+            self.days[day] = self.days.get(day, 0) + 1
+
+        if self.postIds is not None:
+            self.postIds.append(messageId)
+            self.postDates.append(int(date.timestamp()))
+
+    def add_range(
+        self,
+        first: int,
+        last: int,
+        count: int,
+        firstDate: datetime.datetime,
+        lastDate: datetime.datetime,
+        tags: typing.Dict[int, int],
+        days: typing.Dict[str, int]=None
+    ):
+        '''
+        Adds precomputed stats of posts that follow the counted ones
+        '''
+        if not count:
+            return
+
+        if not self.count:
+            self.first = first
+            self.firstDate = firstDate
+
+        self.last = last
+        self.lastDate = lastDate
+        self.count += count
+
+        for tag, value in tags.items():
+            self.count_tag(tag, value)
+
+        if self.histogram and days:
+            for day, value in days.items():
+                self.days[day] = self.days.get(day, 0) + value
+
+    def discard_first(self, tags: typing.Iterable[int], date: datetime.datetime):
+        '''
+        Removes the first counted post, used to count albums split between
+        two scans once, see merge_scan_results()
+
+        :param tags: Tags of the post
+        :param date: Date of the post
+        '''
+        self.count -= 1
+
+        for tag in tags:
+            if self.heavyHitters is not None:
+                self.heavyHitters.discard(tag)
+            else:
+                self._tagCounts[tag] = self._tagCounts.get(tag, 0) - 1
+
+        day = date.strftime("%Y-%m-%d")
+        if day in self.days:
+            self.days[day] -= 1
+            if not self.days[day]:
+                self.days.pop(day)
+
+        if self.postIds is not None and self.postIds:
+            self.postIds.pop(0)
+            self.postDates.pop(0)
+
+    def merge(self, other: "StatsAccumulator"):
+        '''
+        Adds stats of posts that follow the counted ones
+        '''
+        if self.heavyHitters is not None and other.heavyHitters is not None:
+            self.add_range(
+                other.first,
+                other.last,
+                other.count,
+                other.firstDate,
+                other.lastDate,
+                {},
+                other.days
+            )
+            self.heavyHitters.merge(other.heavyHitters)
+        else:
+            self.add_range(
+                other.first,
+                other.last,
+                other.count,
+                other.firstDate,
+                other.lastDate,
+                other.tags,
+                other.days
+            )
+
+        if self.postIds is not None and other.postIds is not None:
+            self.postIds.extend(other.postIds)
+            self.postDates.extend(other.postDates)
+
+    @property
+    def tags(self) -> typing.Dict[int, int]:
+        '''
+        Returns { tag id: number of posts } for tags found at least once,
+        in topK mode counts are approximate, see SpaceSaving
+        '''
+        if self.heavyHitters is not None:
+            return {tag: value for tag, value in self.heavyHitters.counts.items() if value > 0}
+
+        return {tag: value for tag, value in self._tagCounts.items() if value > 0}
+
+    def to_document(self) -> dict:
+        '''
+        Returns stats as MongoDB document for job checkpoints and results
+        '''
+        document = {
+            "first": self.first,
+            "last": self.last,
+            "count": self.count,
+            "firstDate": self.firstDate,
+            "lastDate": self.lastDate,
+            "histogram": self.histogram,
+            "days": self.days,
+            #  MongoDB keys are strings, so ids are stored as pairs
+            "tags": list(self.tags.items())
+        }
+
+        if self.heavyHitters is not None:
+            document["topK"] = self.topK
+            document["heavyHitters"] = self.heavyHitters.to_document()
+
+        if self.postIds is not None:
+            document["postIds"] = self.postIds.tobytes()
+            document["postDates"] = self.postDates.tobytes()
+
+        return document
+
+    @classmethod
+    def from_document(cls, document: dict) -> "StatsAccumulator":
+        '''
+        Restores stats saved with to_document()
+        '''
+        stats = cls(document["histogram"], "postIds" in document, document.get("topK"))
+        stats.first = document["first"]
+        stats.last = document["last"]
+        stats.count = document["count"]
+        stats.firstDate = document["firstDate"]
+        stats.lastDate = document["lastDate"]
+        stats.days = document["days"]
+
+        if stats.heavyHitters is not None:
+            stats.heavyHitters = SpaceSaving.from_document(document["heavyHitters"])
+        else:
+            stats._tagCounts = dict(document["tags"])
+
+        if stats.postIds is not None:
+            stats.postIds.frombytes(document["postIds"])
+            stats.postDates.frombytes(document["postDates"])
+
+        return stats
@@ -0,0 +1,49 @@
+import typing
+
+
+class CancellationToken():
+    '''
+    Flag checked by a running job to stop as soon as possible
+
+    Checking it is free, unlike reading the user's state from the storage
+    '''
+    __slots__ = ("cancelled", )
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def __bool__(self) -> bool:
+        return self.cancelled
+
+
+class CancellationRegistry():
+    '''
+    Cancellation tokens of the jobs running in the current instance
+    keyed by user id and job id
+    '''
+    def __init__(self):
+        self._tokens: typing.Dict[int, typing.Dict[str, CancellationToken]] = {}
+
+    def register(self, userId: int, jobId: str) -> CancellationToken:
+        return self._tokens.setdefault(userId, {}).setdefault(jobId, CancellationToken())
+
+    def unregister(self, userId: int, jobId: str):
+        userTokens = self._tokens.get(userId, {})
+        userTokens.pop(jobId, None)
+
+        if not userTokens:
+            self._tokens.pop(userId, None)
+
+    def cancel(self, userId: int, jobId: str=None):
+        '''
+        Cancels the user's job or all jobs of the user if jobId is None
+        '''
+        for tokenJobId, token in self._tokens.get(userId, {}).items():
+            if jobId is None or tokenJobId == jobId:
+                token.cancel()
+
+
+cancellations = CancellationRegistry()
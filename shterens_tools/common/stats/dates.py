@@ -0,0 +1,231 @@
+import bisect
+import typing
+import datetime
+from .index import *
+from collections import OrderedDict
+from ..apis.mtprotoapi import *
+from ..utils.regex import is_date
+
+#  Number of ids requested by one probe, deleted messages
+#  are skipped without extra requests
+DATE_PROBE_WINDOW = 16
+#  Number of channels and anchors per channel kept in the cache
+DATE_ANCHORS_CHANNELS = 64
+DATE_ANCHORS_LIMIT = 1024
+
+
+class DateAnchors():
+    '''
+    Known ( message id, date ) pairs of channels, dates of channel posts
+    grow with ids, so each pair narrows the search of any other date
+
+    :param channels: Number of channels stored, the least
+        recently used channel is dropped first
+    :param limit: Number of pairs stored per channel, when it's reached,
+        every second pair is dropped
+    '''
+    def __init__(self, channels: int=DATE_ANCHORS_CHANNELS, limit: int=DATE_ANCHORS_LIMIT):
+        self.channels = channels
+        self.limit = limit
+        #  { chatId: ( sorted ids, dates of these ids ) }
+        self._chats: OrderedDict[int, typing.Tuple[typing.List[int], typing.List[datetime.datetime]]] = OrderedDict()
+
+    def _anchors(self, chatId: int) -> typing.Tuple[typing.List[int], typing.List[datetime.datetime]]:
+        if chatId not in self._chats:
+            self._chats[chatId] = ([], [])
+            if len(self._chats) > self.channels:
+                self._chats.popitem(last=False)
+
+        self._chats.move_to_end(chatId)
+        return self._chats[chatId]
+
+    def add(self, chatId: int, messageId: int, date: datetime.datetime):
+        ids, dates = self._anchors(chatId)
+        position = bisect.bisect_left(ids, messageId)
+
+        if position < len(ids) and ids[position] == messageId:
+            return
+
+        ids.insert(position, messageId)
+        dates.insert(position, date)
+
+        if len(ids) > self.limit:
+            del ids[1::2], dates[1::2]
+
+    def last(self, chatId: int) -> int:
+        '''
+        Returns the largest known post id or 0
+        '''
+        ids, _ = self._anchors(chatId)
+        return ids[-1] if ids else 0
+
+    def bounds(self, chatId: int, date: datetime.datetime) -> typing.Tuple[int, int | None]:
+        '''
+        Returns ( id after the last known post published before the date,
+        id of the first known post published at the date or later )
+        '''
+        ids, dates = self._anchors(chatId)
+        position = bisect.bisect_left(dates, date)
+
+        start = ids[position-1] + 1 if position > 0 else 1
+        end = ids[position] if position < len(ids) else None
+        return start, end
+
+
+dateAnchors = DateAnchors()
+
+
+def parse_date(text: str) -> datetime.datetime | None:
+    '''
+    Returns beginning of the day in DD.MM.YYYY format or None
+    '''
+    if not is_date(text):
+        return None
+
+    try:
+        return datetime.datetime.strptime(text, "%d.%m.%Y")
+    except ValueError:
+        return None
+
+
+async def _probe_last(chatId: int, startId: int) -> int | None:
+    '''
+    Returns id of the last existing message from startId
+    to startId + MESSAGES_WINDOW_SIZE - 1 using one request
+    '''
+    lastId = None
+
+    for message in await get_messages_window(chatId, startId, startId+MESSAGES_WINDOW_SIZE-1):
+        if not message.empty:
+            lastId = message.id
+            if not message.service:
+                dateAnchors.add(chatId, message.id, message.date)
+
+    return lastId
+
+
+async def get_last_post_id(chatId: int) -> int:
+    '''
+    Returns id of the last channel message
+
+    Bots can't request the chat history, so get_messages windows are
+    probed upward from the last known post with doubling steps, then
+    the gap before the first empty window is binary searched. It takes
+    about 2 * log2(new messages / MESSAGES_WINDOW_SIZE) requests,
+    a window of deleted messages is taken as the end of the channel
+    '''
+    channel = await get_channel_bounds(chatId)
+    lastId = max(channel.get("lastId") or 0, dateAnchors.last(chatId))
+
+    #  Messages from endId are not sent yet
+    endId = None
+    step = 0
+
+    while endId is None:
+        startId = lastId + 1 + step
+        foundId = await _probe_last(chatId, startId)
+
+        if foundId is None:
+            endId = startId
+        else:
+            lastId = foundId
+            step = step * 2 or MESSAGES_WINDOW_SIZE
+
+    while endId - lastId > 1:
+        if endId - lastId - 1 > MESSAGES_WINDOW_SIZE:
+            startId = (lastId + 1 + endId) // 2
+        else:
+            startId = lastId + 1
+
+        foundId = await _probe_last(chatId, startId)
+
+        if foundId is None:
+            endId = startId
+        else:
+            lastId = foundId
+            #  The rest of the window is empty
+            if startId + MESSAGES_WINDOW_SIZE >= endId:
+                endId = lastId + 1
+
+    return lastId
+
+
+async def _probe(chatId: int, startId: int, endId: int) -> typing.List[typing.Tuple[int, datetime.datetime]]:
+    '''
+    Returns ( id, date ) of existing posts from startId to endId using one request
+    '''
+    found = []
+
+    for message in await get_messages_window(chatId, startId, endId):
+        if not message.empty and not message.service:
+            dateAnchors.add(chatId, message.id, message.date)
+            found.append((message.id, message.date))
+
+    return found
+
+
+async def _search(chatId: int, date: datetime.datetime, low: int, high: int) -> int:
+    '''
+    Binary searches the first post published at the date or later
+    in ids from low to high - 1, returns high if there is no such post
+
+    Posts before low must be published before the date
+    '''
+    while low < high:
+        #  The rest of the interval fits into one request
+        if high - low <= DATE_PROBE_WINDOW:
+            for messageId, messageDate in await _probe(chatId, low, high-1):
+                if messageDate >= date:
+                    return messageId
+            return high
+
+        middle = (low + high) // 2
+        probeEnd = min(middle + DATE_PROBE_WINDOW - 1, high - 1)
+        found = await _probe(chatId, middle, probeEnd)
+
+        if not found:
+            #  Probed ids are deleted, so the left part is searched separately
+            messageId = await _search(chatId, date, low, middle)
+            if messageId < middle:
+                return messageId
+            low = probeEnd + 1
+            continue
+
+        for messageId, messageDate in found:
+            if messageDate < date:
+                low = messageId + 1
+            else:
+                high = messageId
+                break
+
+    return high
+
+
+async def resolve_date(chatId: int, date: datetime.datetime, lastId: int=None) -> int:
+    '''
+    Returns id of the first channel post published at the date or later,
+    or last message id + 1 if there are no such posts
+
+    Message ids are binary searched with get_messages requests of
+    DATE_PROBE_WINDOW ids, the search starts between the closest known
+    anchors including the channel index, so it takes about log2(lastId)
+    requests and much less for dates close to the resolved ones
+
+    :param lastId: Last message id of the channel, requested if needed
+    '''
+    channel = await get_channel_bounds(chatId)
+
+    if channel.get("firstId") is not None:
+        dateAnchors.add(chatId, channel["firstId"], channel["firstDate"])
+        dateAnchors.add(chatId, channel["lastId"], channel["lastDate"])
+
+    low, high = dateAnchors.bounds(chatId, date)
+
+    if high is None:
+        if lastId is None:
+            lastId = await get_last_post_id(chatId)
+        high = lastId + 1
+    elif lastId is not None:
+        high = min(high, lastId + 1)
+
+    return await _search(chatId, date, low, high)
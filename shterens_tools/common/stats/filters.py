@@ -0,0 +1,104 @@
+import typing
+from .tags import *
+
+
+class TagFilter():
+    '''
+    Include or exclude lists of tag ids compiled into frozensets,
+    applied to tags of every post while the posts are counted
+
+    :param include: Count only these tags, exclude is ignored if it's not empty
+    :param exclude: Don't count these tags
+    :param includeNames: Normalized tags to include that aren't in tagTable yet
+    :param excludeNames: Normalized tags to exclude that aren't in tagTable yet
+
+    Use from_tags() to compile lists of tags entered by the user
+    '''
+    __slots__ = ("include", "exclude", "includeNames", "excludeNames", "_includeOnly")
+
+    def __init__(
+        self,
+        include: typing.Iterable[int]=(),
+        exclude: typing.Iterable[int]=(),
+        includeNames: typing.Iterable[str]=(),
+        excludeNames: typing.Iterable[str]=()
+    ):
+        self.include = frozenset(include)
+        self.includeNames = frozenset(includeNames)
+        #  Tags that aren't found yet still turn on the include list
+        self._includeOnly = bool(self.include or self.includeNames)
+
+        if self._includeOnly:
+            self.exclude = self.excludeNames = frozenset()
+        else:
+            self.exclude = frozenset(exclude)
+            self.excludeNames = frozenset(excludeNames)
+
+    @classmethod
+    async def from_tags(cls, include: typing.Iterable[str]=(), exclude: typing.Iterable[str]=()) -> "TagFilter":
+        '''
+        Compiles lists of tags, they are matched case-insensitively, see normalize_tag()
+
+        Only ids of known tags are looked up, other tags are kept
+        as normalized strings and resolved once they're found during the scan
+        '''
+        include = set(map(normalize_tag, include))
+        exclude = set(map(normalize_tag, exclude))
+        ids = await tagTable.lookup(include | exclude)
+
+        return cls(
+            [ids[tag] for tag in include if tag in ids],
+            [ids[tag] for tag in exclude if tag in ids],
+            include - ids.keys(),
+            exclude - ids.keys()
+        )
+
+    @property
+    def pending(self) -> bool:
+        '''
+        Checks if some tags aren't resolved to ids yet
+        '''
+        return bool(self.includeNames or self.excludeNames)
+
+    def _add(self, ids: typing.Dict[str, int]):
+        self.include |= {tagId for tag, tagId in ids.items() if tag in self.includeNames}
+        self.exclude |= {tagId for tag, tagId in ids.items() if tag in self.excludeNames}
+        self.includeNames -= ids.keys()
+        self.excludeNames -= ids.keys()
+
+    def resolve(self):
+        '''
+        Resolves tags added to tagTable since the filter was compiled,
+        called after tags of the scanned posts are interned
+        '''
+        if self.pending:
+            cached = {tag: tagTable.cached(tag) for tag in self.includeNames | self.excludeNames}
+            self._add({tag: tagId for tag, tagId in cached.items() if tagId is not None})
+
+    async def refresh(self):
+        '''
+        Resolves tags added to the tags collection since the filter was compiled,
+        e.g. by other instances, before indexed posts are counted
+        '''
+        if self.pending:
+            self._add(await tagTable.lookup(self.includeNames | self.excludeNames))
+
+    def __bool__(self) -> bool:
+        return bool(self._includeOnly or self.exclude or self.excludeNames)
+
+    def match(self, tag: int) -> bool:
+        if self._includeOnly:
+            return tag in self.include
+        return tag not in self.exclude
+
+    def apply(self, tags: typing.Iterable[int]) -> typing.List[int]:
+        '''
+        Returns tags that should be counted
+        '''
+        return [tag for tag in tags if self.match(tag)]
+
+    def apply_counts(self, tags: typing.Dict[int, int]) -> typing.Dict[int, int]:
+        '''
+        Returns { tag: number of posts } for tags that should be counted
+        '''
+        return {tag: value for tag, value in tags.items() if self.match(tag)}
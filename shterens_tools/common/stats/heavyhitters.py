@@ -0,0 +1,152 @@
+import heapq
+import typing
+
+#  Number of counters kept per requested top tag,
+#  more counters make the approximate counts more accurate
+HEAVY_HITTERS_FACTOR = 10
+
+
+class SpaceSaving():
+    '''
+    Space-Saving summary of the most frequent tags
+
+    Only capacity counters are kept, when a new tag arrives and all
+    counters are taken, the tag with the smallest count is replaced
+    and the new tag inherits its count as the error. Counts are never
+    underestimated and overestimated by at most the tag's error,
+    which is not larger than total / capacity
+
+    Summaries are merged as mergeable summaries, see merge()
+
+    :param capacity: Maximum number of counted tags
+    '''
+    __slots__ = ("capacity", "total", "floor", "counts", "errors", "_heap")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        #  Number of counted tag occurrences
+        self.total = 0
+        #  Upper bound of the count of tags dropped by merges,
+        #  new tags are counted from it
+        self.floor = 0
+        self.counts: typing.Dict[int, int] = {}
+        self.errors: typing.Dict[int, int] = {}
+        #  ( count, tag ) min-heap, entries with outdated counts are skipped
+        self._heap: typing.List[typing.Tuple[int, int]] = []
+
+    def add(self, tag: int, count: int=1, error: int=0):
+        '''
+        Counts count occurrences of the tag
+
+        :param error: Known overestimation of count, used to merge summaries
+        '''
+        self.total += count
+
+        if tag in self.counts:
+            self.counts[tag] += count
+            self.errors[tag] += error
+
+        elif len(self.counts) < self.capacity:
+            self.counts[tag] = self.floor + count
+            self.errors[tag] = self.floor + error
+
+        else:
+            minCount, minTag = self._pop_min()
+            self.counts.pop(minTag)
+            self.errors.pop(minTag)
+            self.counts[tag] = minCount + count
+            self.errors[tag] = minCount + error
+
+        self._push(tag)
+
+    def discard(self, tag: int):
+        '''
+        Removes one occurrence of the tag if it's counted
+        '''
+        if self.counts.get(tag, 0) > 0:
+            self.total -= 1
+            self.counts[tag] -= 1
+            self._push(tag)
+
+    def merge(self, other: "SpaceSaving"):
+        '''
+        Adds counts of the other summary
+
+        Tags missing in one of the summaries are credited with
+        its minimum count, since they could have been evicted from it,
+        then capacity tags with the largest counts are kept
+        '''
+        selfMin, otherMin = self.minCount, other.minCount
+        counts = {}
+        errors = {}
+
+        for tag in self.counts.keys() | other.counts.keys():
+            counts[tag] = self.counts.get(tag, selfMin) + other.counts.get(tag, otherMin)
+            errors[tag] = self.errors.get(tag, selfMin) + other.errors.get(tag, otherMin)
+
+        kept = heapq.nlargest(self.capacity, counts, key=counts.get)
+        self.counts = {tag: counts[tag] for tag in kept}
+        self.errors = {tag: errors[tag] for tag in kept}
+        self.total += other.total
+        self.floor = selfMin + otherMin
+        self._rebuild()
+
+    @property
+    def minCount(self) -> int:
+        '''
+        Upper bound of the count of any tag that isn't kept
+        '''
+        if len(self.counts) < self.capacity:
+            return self.floor
+        return max(self.floor, min(self.counts.values()))
+
+    @property
+    def maxError(self) -> int:
+        '''
+        Upper bound of the overestimation of any count,
+        after merges it's the sum of the minimum counts of the summaries
+        '''
+        return max(self.floor, max(self.errors.values(), default=0))
+
+    def top(self, k: int) -> typing.List[typing.Tuple[int, int]]:
+        '''
+        Returns k most frequent tags as ( tag, count ) ordered by count
+        '''
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+    def to_document(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "floor": self.floor,
+            #  MongoDB keys are strings, so tag ids are stored as pairs
+            "counts": list(self.counts.items()),
+            "errors": list(self.errors.items())
+        }
+
+    @classmethod
+    def from_document(cls, document: dict) -> "SpaceSaving":
+        summary = cls(document["capacity"])
+        summary.total = document["total"]
+        summary.floor = document.get("floor", 0)
+        summary.counts = dict(document["counts"])
+        summary.errors = dict(document["errors"])
+        summary._rebuild()
+        return summary
+
+    def _push(self, tag: int):
+        heapq.heappush(self._heap, (self.counts[tag], tag))
+
+        #  Outdated entries are dropped when there are too many of them
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(count, tag) for tag, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_min(self) -> typing.Tuple[int, int]:
+        while True:
+            count, tag = heapq.heappop(self._heap)
+            if self.counts.get(tag) == count:
+                return count, tag
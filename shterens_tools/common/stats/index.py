@@ -0,0 +1,418 @@
+import typing
+import datetime
+from collections import Counter
+from pymongo import UpdateOne, ReturnDocument
+from .rollups import *
+from ..resources.mongodb import *
+from ..apis.mtprotoapi import pyrogram
+
+#  Number of scanned ids after which posts are written to the index
+INDEX_FLUSH_SIZE = 1000
+#  Number of stored ranges after which they are merged in the database
+INDEX_RANGES_LIMIT = 32
+#  Number of attempts to merge ranges changed by other writers at the same time
+INDEX_COMPACT_ATTEMPTS = 3
+
+
+def merge_ranges(ranges: typing.List[typing.List[int]]) -> typing.List[typing.List[int]]:
+    '''
+    Sorts ranges and merges the overlapping and adjacent ones
+    [[5, 9], [1, 3], [4, 4]] => [[1, 9]]
+
+    '''
+    merged = []
+
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return merged
+
+
+def split_range(
+    ranges: typing.List[typing.List[int]],
+    startId: int,
+    endId: int
+) -> typing.List[typing.Tuple[int, int, bool]]:
+    '''
+    Splits range from startId to endId into segments that are already
+    indexed and those that need to be scanned
+
+    :param ranges: Merged indexed ranges, see merge_ranges()
+
+    Returns ordered list of ( segmentStart, segmentEnd, isIndexed )
+    '''
+    segments = []
+
+    for start, end in ranges:
+        if end < startId or start > endId:
+            continue
+
+        if start > startId:
+            segments.append((startId, start-1, False))
+
+        segments.append((max(start, startId), min(end, endId), True))
+        startId = end + 1
+
+    if startId <= endId:
+        segments.append((startId, endId, False))
+
+    return segments
+
+
+def post_to_document(
+    chatId: int,
+    message: pyrogram.types.Message,
+    tags: typing.List[int],
+    size: int
+) -> dict:
+    '''
+    Creates posts_index document
+
+    :param message: First message of the post
+    :param tags: Ids of the hashtags found in the post, see tagTable
+    :param size: Number of messages in the post
+    '''
+    return {
+        "chat": chatId,
+        "id": message.id,
+        "date": message.date,
+        "group": message.media_group_id,
+        "size": size,
+        "tags": tags
+    }
+
+
+async def get_channel_index(chatId: int) -> dict:
+    '''
+    Returns channels_index document with merged ranges
+
+    Document contains indexed ranges, number of indexed posts,
+    { tag id: number of posts } counters, first and last post ids and dates
+    '''
+    channel = await channelsIndexCollection.find_one({ "_id": chatId })
+
+    if channel is None:
+        return { "_id": chatId, "ranges": [], "posts": 0, "tags": {} }
+
+    channel["ranges"] = merge_ranges(channel["ranges"])
+    channel.setdefault("posts", 0)
+    channel["tags"] = {int(tag): value for tag, value in channel.get("tags", {}).items()}
+    return channel
+
+
+async def get_channel_bounds(chatId: int) -> dict:
+    '''
+    Returns first and last indexed post ids and dates of the channel
+    without ranges and counters, the dict is empty if nothing is indexed
+    '''
+    channel = await channelsIndexCollection.find_one(
+        { "_id": chatId },
+        { "_id": 0, "firstId": 1, "lastId": 1, "firstDate": 1, "lastDate": 1 }
+    )
+    return channel or {}
+
+
+def is_whole_index(channel: dict, startId: int, endId: int) -> bool:
+    '''
+    Checks if the range from startId to endId is indexed and contains
+    all indexed posts of the channel, so channel counters can be used as stats
+
+    '''
+    if not channel["posts"]:
+        return False
+
+    for start, end in channel["ranges"]:
+        if start <= startId and end >= endId:
+            return channel["firstId"] >= startId and channel["lastId"] <= endId
+
+    return False
+
+
+async def iter_indexed_posts(chatId: int, startId: int, endId: int) -> typing.AsyncIterator[dict]:
+    '''
+    Yields indexed posts of the channel from startId to endId ordered by id
+
+    '''
+    cursor = postsIndexCollection.find(
+        { "chat": chatId, "id": { "$gte": startId, "$lte": endId } },
+        { "_id": 0, "id": 1, "date": 1, "group": 1, "size": 1, "tags": 1 }
+    ).sort("id", 1)
+
+    async for document in cursor:
+        yield document
+
+
+def merge_album_parts(posts: typing.List[dict], edited: bool=False) -> typing.List[dict]:
+    '''
+    Returns posts ordered by id, in which parts of the same album
+    are merged into its part with the lowest id, posts aren't changed
+
+    :param edited: Posts are edited versions of messages, so they don't
+        change the size of albums
+    '''
+    merged = []
+    heads = {}
+
+    for post in sorted(posts, key=lambda post: post["id"]):
+        head = heads.get(post["group"])
+
+        if head is None:
+            post = dict(post)
+            merged.append(post)
+            if post["group"] is not None:
+                heads[post["group"]] = post
+            continue
+
+        head["tags"] = head["tags"] + [tag for tag in post["tags"] if tag not in head["tags"]]
+        if not edited:
+            head["size"] += post["size"]
+
+    return merged
+
+
+async def _fold_albums(
+    chatId: int,
+    groups: typing.Iterable[str],
+    sizeless: typing.Set[int]
+) -> typing.Tuple[int, Counter, typing.List[datetime.datetime]]:
+    '''
+    Merges parts of the albums stored as separate posts into the part
+    with the lowest id, so the album is counted once whatever order
+    its parts were indexed in
+
+    Every part is deleted and added to the album with atomic writes,
+    so albums merged by several writers at once are counted correctly
+
+    :param sizeless: Ids of the parts that don't change the size of the album
+
+    Returns change of the number of posts, of the tags counters
+    and dates of the changed posts
+    '''
+    posts = 0
+    counters = Counter()
+    dates = []
+    albums = {}
+
+    cursor = postsIndexCollection.find(
+        { "chat": chatId, "group": { "$in": list(groups) } },
+        { "_id": 0, "id": 1, "group": 1 }
+    ).sort("id", 1)
+
+    async for document in cursor:
+        albums.setdefault(document["group"], []).append(document["id"])
+
+    for group, ids in albums.items():
+        for partId in ids[1:]:
+            part = await postsIndexCollection.find_one_and_delete(
+                { "chat": chatId, "id": partId },
+                projection={ "_id": 0 }
+            )
+            #  Merged by another writer
+            if part is None:
+                continue
+
+            head = await postsIndexCollection.find_one_and_update(
+                { "chat": chatId, "group": group, "id": { "$lt": partId } },
+                {
+                    "$addToSet": {
+                        "tags": { "$each": part["tags"] },
+                        #  Ids of the merged parts, their rows are removed from the warehouse
+                        "parts": { "$each": [partId] + part.get("parts", []) }
+                    },
+                    "$inc": { "size": 0 if partId in sizeless else part["size"] },
+                    "$currentDate": { "updated": True }
+                },
+                projection={ "_id": 0, "date": 1, "tags": 1 },
+                sort=[("id", 1)]
+            )
+
+            #  Parts with lower ids are only deleted when they are merged into
+            #  an even lower part, so it can't happen, but the part isn't lost
+            if head is None:
+                await postsIndexCollection.insert_one(part)
+                continue
+
+            posts -= 1
+            counters.subtract(part["tags"])
+            counters.update(tag for tag in part["tags"] if tag not in head["tags"])
+            dates += [part["date"], head["date"]]
+
+    return posts, counters, dates
+
+
+async def index_posts(
+    chatId: int,
+    posts: typing.List[dict],
+    startId: int=None,
+    endId: int=None,
+    edited: bool=False,
+    ranges: typing.List[typing.List[int]]=None
+):
+    '''
+    Saves posts to the index and updates channel tags counters
+    and rollups of the periods in which the posts were published
+
+    Posts that are parts of an already indexed album are merged into it,
+    posts that are already indexed are replaced and counters are corrected
+
+    Counters are changed by the results of the writes, not by the posts
+    read before them, so writers indexing the same posts at once,
+    like overlapping scans or a scan and live posts, count them once
+
+    :param posts: Documents created with post_to_document()
+    :param startId: If passed with endId, range from startId to endId is marked
+        as indexed, including ids of empty and service messages
+    :param edited: Posts are edited versions of messages, so they don't
+        change the size of albums
+    :param ranges: [ startId, endId ] ranges marked as indexed,
+        used instead of startId and endId when ids have gaps
+    '''
+    counters = Counter()
+    #  Dates of the changed posts before and after the change
+    dates = []
+    newPosts = 0
+    posts = merge_album_parts(posts, edited)
+
+    if posts:
+        stored = {}
+        cursor = postsIndexCollection.find(
+            { "chat": chatId, "id": { "$in": [post["id"] for post in posts] } },
+            { "_id": 0, "id": 1, "date": 1, "group": 1, "tags": 1 }
+        )
+        async for document in cursor:
+            stored[document["id"]] = document
+
+        inserted = [post for post in posts if post["id"] not in stored]
+        replaced = []
+
+        for post in posts:
+            old = stored.get(post["id"])
+            if old is None:
+                continue
+
+            #  Tags of the album parts merged into it are kept
+            merge = post["group"] is not None and not edited
+            if (
+                old["date"] != post["date"] or old["group"] != post["group"]
+                or (not set(post["tags"]) <= set(old["tags"]) if merge else old["tags"] != post["tags"])
+            ):
+                replaced.append((post, merge))
+
+        if inserted:
+            result = await postsIndexCollection.bulk_write(
+                [
+                    UpdateOne(
+                        { "chat": chatId, "id": post["id"] },
+                        #  Changed posts are read by the warehouse, see get_warehouse()
+                        { "$setOnInsert": post, "$currentDate": { "updated": True } },
+                        upsert=True
+                    )
+                    for post in inserted
+                ],
+                ordered=False
+            )
+
+            #  Posts inserted by other writers at the same time are counted by them
+            for number in result.upserted_ids:
+                newPosts += 1
+                counters.update(inserted[number]["tags"])
+                dates.append(inserted[number]["date"])
+
+        for post, merge in replaced:
+            fields = {field: value for field, value in post.items() if field not in ("size", "tags")}
+            update = { "$set": fields, "$currentDate": { "updated": True } }
+
+            if merge:
+                update["$addToSet"] = { "tags": { "$each": post["tags"] } }
+            else:
+                fields["tags"] = post["tags"]
+
+            old = await postsIndexCollection.find_one_and_update(
+                { "chat": chatId, "id": post["id"] },
+                update,
+                projection={ "_id": 0, "date": 1, "tags": 1 }
+            )
+            #  Merged into its album by another writer
+            if old is None:
+                continue
+
+            if merge:
+                counters.update(tag for tag in post["tags"] if tag not in old["tags"])
+            else:
+                counters.subtract(old["tags"])
+                counters.update(post["tags"])
+            dates += [old["date"], post["date"]]
+
+        groups = {post["group"] for post in posts if post["group"] is not None}
+        if groups:
+            sizeless = {post["id"] for post in inserted} if edited else set()
+            foldedPosts, foldedCounters, foldedDates = await _fold_albums(chatId, groups, sizeless)
+            newPosts += foldedPosts
+            counters.update(foldedCounters)
+            dates += foldedDates
+
+        #  If it fails, ranges aren't marked as indexed, so the posts
+        #  are written again and their rollups are counted again
+        await refresh_rollups(chatId, dates)
+
+    update = {}
+
+    ranges = list(ranges or [])
+    if startId is not None:
+        ranges.append([startId, endId])
+    if ranges:
+        update["$push"] = { "ranges": { "$each": ranges } }
+
+    increments = { f"tags.{tag}": value for tag, value in counters.items() if value }
+    if newPosts:
+        increments["posts"] = newPosts
+    if increments:
+        update["$inc"] = increments
+
+    if posts:
+        update["$min"] = { "firstId": posts[0]["id"], "firstDate": posts[0]["date"] }
+        update["$max"] = { "lastId": posts[-1]["id"], "lastDate": posts[-1]["date"] }
+
+    if not update:
+        return
+
+    #  Derived data like the warehouse is updated when it changes
+    update["$currentDate"] = { "updated": True }
+
+    channel = await channelsIndexCollection.find_one_and_update(
+        { "_id": chatId },
+        update,
+        projection={ "ranges": 1 },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+    await compact_ranges(chatId, channel.get("ranges", []))
+
+
+async def compact_ranges(chatId: int, ranges: typing.List[typing.List[int]]):
+    '''
+    Merges stored ranges of the channel if there are too many of them
+
+    Ranges are replaced only if they haven't changed since they were read,
+    otherwise they are read again, so ranges pushed by other writers
+    are never lost. If all attempts fail, the next writer merges them
+    '''
+    for _ in range(INDEX_COMPACT_ATTEMPTS):
+        merged = merge_ranges(ranges)
+        if len(ranges) <= INDEX_RANGES_LIMIT or len(merged) == len(ranges):
+            return
+
+        result = await channelsIndexCollection.update_one(
+            { "_id": chatId, "ranges": ranges },
+            { "$set": { "ranges": merged } }
+        )
+
+        if result.modified_count:
+            return
+
+        channel = await channelsIndexCollection.find_one({ "_id": chatId }, { "ranges": 1 })
+        ranges = channel.get("ranges", [])
@@ -0,0 +1,411 @@
+import time
+import uuid
+import typing
+import asyncio
+import datetime
+from ..resources.logs import *
+from .cancellation import *
+from ..resources.mongodb import *
+from pymongo import ReturnDocument
+from collections import Counter
+from pymongo.errors import PyMongoError, BulkWriteError
+
+#  Seconds during which the job belongs to the instance without heartbeat
+JOB_LEASE_TIME = 60
+JOB_HEARTBEAT_INTERVAL = 20
+#  Seconds between checks of the queue
+JOB_POLL_INTERVAL = 2
+#  Minimal number of seconds between two checkpoints of the job
+JOB_CHECKPOINT_INTERVAL = 30
+#  Fields of child jobs read on every poll of wait_children(), enough for progress
+CHILD_POLL_PROJECTION = { "status": 1, "lastId": 1, "params.range": 1 }
+
+#  Id of the current instance, the owner of its jobs
+instanceId = uuid.uuid4().hex
+
+
+class JobStatus():
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+
+class Job():
+    '''
+    Background job stored in the jobs collection
+
+    :param document: jobs collection document
+
+    Handler should stop when cancelled becomes True and set status
+    to JobStatus.CANCELLED before returning, otherwise the job is marked as done
+    '''
+    def __init__(self, document: dict):
+        self.id: str = document["_id"]
+        self.kind: str = document["kind"]
+        self.user: int = document["user"]
+        self.params: dict = document["params"]
+        self.parent: str | None = document.get("parent")
+        self.lastId: int | None = document.get("lastId")
+        self.checkpointData: dict | None = document.get("checkpoint")
+        self.status = JobStatus.RUNNING
+        self.token = cancellations.register(self.user, self.id)
+
+        self._checkpointTime = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        '''
+        Whether the job has been cancelled by the user in any instance
+        '''
+        return self.token.cancelled
+
+    async def checkpoint(
+        self,
+        lastId: int,
+        data: dict | typing.Callable[[], dict],
+        force: bool=False
+    ):
+        '''
+        Saves job progress, so the job can be resumed from lastId + 1
+
+        :param lastId: Last processed message id
+        :param data: Partial results of the job or a function returning them,
+            which is called only when the checkpoint is written
+        :param force: Write progress even if JOB_CHECKPOINT_INTERVAL hasn't passed
+        '''
+        self.lastId = lastId
+        self.checkpointData = data
+
+        if not force and time.monotonic() - self._checkpointTime < JOB_CHECKPOINT_INTERVAL:
+            return
+
+        if callable(data):
+            data = data()
+
+        self._checkpointTime = time.monotonic()
+        await jobsCollection.update_one(
+            { "_id": self.id, "owner": instanceId },
+            { "$set": { "lastId": lastId, "checkpoint": data, "updated": datetime.datetime.utcnow() } }
+        )
+
+
+class JobRunner():
+    '''
+    Runs jobs from the MongoDB queue as supervised asyncio tasks
+
+    Jobs are stored in the jobs collection, every instance claims queued jobs
+    atomically and leases them while they run, if the instance stops or
+    crashes, any instance resumes its jobs from the last checkpoint
+    after the lease expires
+
+    Large jobs can be split into child jobs, which are processed in parallel
+    by all instances, see submit_children() and wait_children()
+
+    Register handlers with register() and call start() on startup
+    '''
+    def __init__(self):
+        self._handlers: typing.Dict[str, typing.Callable[[Job], typing.Awaitable]] = {}
+        self._concurrency: typing.Dict[str, int | None] = {}
+        self._tasks: typing.Dict[str, asyncio.Task] = {}
+        self._jobs: typing.Dict[str, Job] = {}
+        self._watcher: asyncio.Task = None
+        self._wakeup: asyncio.Event = None
+
+    def register(self, kind: str, concurrency: int=None):
+        '''
+        Decorator to register a handler for jobs of the kind
+
+        :param kind: Kind of jobs
+        :param concurrency: Maximum number of jobs of the kind running
+            in one instance, unlimited by default
+
+        @jobRunner.register("getstats")
+        async def getstats_job(job: Job): ...
+
+        Value returned by the handler is saved as the job result
+        '''
+        def decorator(handler: typing.Callable[[Job], typing.Awaitable]):
+            self._handlers[kind] = handler
+            self._concurrency[kind] = concurrency
+            return handler
+        return decorator
+
+    async def submit(self, kind: str, user: int, params: dict) -> str:
+        '''
+        Puts a job into the queue, it will be claimed by the first free instance
+
+        :param kind: Kind of the registered handler
+        :param user: Id of the user who requested the job
+        :param params: Job parameters passed to the handler
+
+        Returns job id
+        '''
+        document = self._create_document(uuid.uuid4().hex, kind, user, params)
+        await jobsCollection.insert_one(document)
+        self._wake()
+        return document["_id"]
+
+    async def submit_children(
+        self,
+        parent: Job,
+        kind: str,
+        paramsList: typing.List[dict]
+    ) -> typing.List[str]:
+        '''
+        Puts child jobs of the parent job into the queue
+
+        Child ids are derived from the parent id, so calling it again
+        after the parent job was resumed doesn't create duplicates
+
+        Returns child job ids
+        '''
+        documents = [
+            self._create_document(f"{parent.id}.{number}", kind, parent.user, params, parent.id)
+            for number, params in enumerate(paramsList)
+        ]
+
+        try:
+            await jobsCollection.insert_many(documents, ordered=False)
+        except BulkWriteError:
+            #  Children have been created before resuming
+            pass
+
+        self._wake()
+        return [document["_id"] for document in documents]
+
+    async def wait_children(
+        self,
+        parent: Job,
+        onPoll: typing.Callable[[typing.List[dict]], typing.Awaitable[bool]]=None
+    ) -> typing.List[dict] | None:
+        '''
+        Waits until all child jobs of the parent are finished
+
+        :param onPoll: Coroutine function called with child documents on every poll,
+            returns False to cancel child jobs and stop waiting, documents
+            have only status, lastId and params.range fields
+
+        Waiting is also stopped if the parent job is cancelled
+
+        Returns child documents ordered by id or None if waiting was cancelled,
+        results are read once, when all child jobs are finished
+        '''
+        while True:
+            children = await self._read_children(parent, CHILD_POLL_PROJECTION)
+
+            if parent.cancelled or onPoll is not None and not await onPoll(children):
+                await self._cancel_unfinished({ "parent": parent.id })
+                return None
+
+            if all(child["status"] not in (JobStatus.QUEUED, JobStatus.RUNNING) for child in children):
+                return await self._read_children(parent, { "checkpoint": 0 })
+
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    async def cancel(self, userId: int):
+        '''
+        Cancels all queued and running jobs of the user
+
+        Jobs running in the current instance are stopped immediately,
+        other instances stop them on the next poll of the queue
+        '''
+        cancellations.cancel(userId)
+        await self._cancel_unfinished({ "user": userId })
+
+    def start(self):
+        '''
+        Starts claiming of queued and abandoned jobs and heartbeat of the running ones
+        '''
+        if self._watcher is None or self._watcher.done():
+            self._wakeup = asyncio.Event()
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        '''
+        Stops running jobs saving their checkpoints and releases their leases,
+        so they can be resumed immediately
+        '''
+        if self._watcher is not None:
+            self._watcher.cancel()
+
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        await jobsCollection.update_many(
+            { "owner": instanceId, "status": JobStatus.RUNNING },
+            { "$set": { "leaseUntil": datetime.datetime.utcnow() } }
+        )
+
+    @staticmethod
+    def _create_document(jobId: str, kind: str, user: int, params: dict, parent: str=None) -> dict:
+        now = datetime.datetime.utcnow()
+        return {
+            "_id": jobId,
+            "kind": kind,
+            "user": user,
+            "params": params,
+            "parent": parent,
+            "status": JobStatus.QUEUED,
+            "owner": None,
+            "leaseUntil": now,
+            "created": now,
+            "updated": now
+        }
+
+    @staticmethod
+    async def _read_children(parent: Job, projection: dict) -> typing.List[dict]:
+        children = await jobsCollection.find({ "parent": parent.id }, projection).to_list(None)
+        children.sort(key=lambda child: int(child["_id"].rsplit(".", 1)[1]))
+        return children
+
+    @staticmethod
+    async def _cancel_unfinished(query: dict):
+        '''
+        Cancels queued and running jobs matching the query
+
+        Jobs are marked as finished here, because the final update
+        of the running ones only changes jobs that are still running
+        '''
+        await jobsCollection.update_many(
+            { **query, "status": { "$in": [JobStatus.QUEUED, JobStatus.RUNNING] } },
+            { "$set": {
+                "status": JobStatus.CANCELLED,
+                "finished": datetime.datetime.utcnow()
+            }}
+        )
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _run(self, job: Job):
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.create_task(self._supervise(job))
+
+    async def _supervise(self, job: Job):
+        result = None
+
+        try:
+            result = await self._handlers[job.kind](job)
+
+        except asyncio.CancelledError:
+            if job.lastId is not None:
+                await job.checkpoint(job.lastId, job.checkpointData, force=True)
+            raise
+
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            errors.critical(
+                f"Job {job.kind} {job.id} : {e.__class__.__name__} : {e}",
+                exc_info=(e.__class__, e, e.__traceback__)
+            )
+
+        else:
+            if job.status == JobStatus.RUNNING:
+                job.status = JobStatus.DONE
+
+        finally:
+            self._tasks.pop(job.id, None)
+            self._jobs.pop(job.id, None)
+            cancellations.unregister(job.user, job.id)
+            #  Free slot can be used by a queued job
+            self._wake()
+
+        await jobsCollection.update_one(
+            { "_id": job.id, "owner": instanceId, "status": JobStatus.RUNNING },
+            { "$set": {
+                "status": job.status,
+                "result": result,
+                "finished": datetime.datetime.utcnow()
+            }}
+        )
+
+    async def _watch(self):
+        heartbeatTime = 0
+
+        while True:
+            try:
+                if time.monotonic() - heartbeatTime >= JOB_HEARTBEAT_INTERVAL:
+                    heartbeatTime = time.monotonic()
+                    await self._heartbeat()
+                await self._check_cancelled()
+                await self._claim()
+            except PyMongoError as e:
+                logger.error(f"JobRunner : {e.__class__.__name__} : {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _heartbeat(self):
+        leaseUntil = datetime.datetime.utcnow() + datetime.timedelta(seconds=JOB_LEASE_TIME)
+
+        for jobId in list(self._tasks):
+            result = await jobsCollection.update_one(
+                { "_id": jobId, "owner": instanceId },
+                { "$set": { "leaseUntil": leaseUntil } }
+            )
+            #  Lease has expired and the job was resumed by another instance
+            if not result.matched_count and jobId in self._tasks:
+                self._tasks[jobId].cancel()
+
+    async def _check_cancelled(self):
+        '''
+        Sets cancellation tokens of the running jobs cancelled in other instances
+        '''
+        if not self._jobs:
+            return
+
+        cursor = jobsCollection.find(
+            { "_id": { "$in": list(self._jobs) }, "status": JobStatus.CANCELLED },
+            { "_id": 1 }
+        )
+
+        async for document in cursor:
+            if document["_id"] in self._jobs:
+                self._jobs[document["_id"]].token.cancel()
+
+    def _free_kinds(self) -> typing.List[str]:
+        running = Counter(job.kind for job in self._jobs.values())
+        return [
+            kind for kind, concurrency in self._concurrency.items()
+            if concurrency is None or running[kind] < concurrency
+        ]
+
+    async def _claim(self):
+        '''
+        Claims queued jobs and jobs with expired lease while there are free slots
+        '''
+        while kinds := self._free_kinds():
+            now = datetime.datetime.utcnow()
+            document = await jobsCollection.find_one_and_update(
+                {
+                    "status": { "$in": [JobStatus.QUEUED, JobStatus.RUNNING] },
+                    "kind": { "$in": kinds },
+                    "leaseUntil": { "$lte": now }
+                },
+                { "$set": {
+                    "status": JobStatus.RUNNING,
+                    "owner": instanceId,
+                    "leaseUntil": now + datetime.timedelta(seconds=JOB_LEASE_TIME),
+                    "updated": now
+                }},
+                sort=[("created", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+
+            if document is None:
+                break
+
+            if document.get("lastId") is not None:
+                logger.info(f"Job {document['kind']} {document['_id']} resumed from id {document['lastId']}")
+            self._run(Job(document))
+
+
+jobRunner = JobRunner()
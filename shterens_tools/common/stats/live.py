@@ -0,0 +1,132 @@
+import typing
+import asyncio
+from .index import *
+from .tags import *
+from ..resources.logs import *
+from ..apis.botapi import types
+from pymongo.errors import PyMongoError
+from ..utils.regex import hashtags_in_text
+
+#  Seconds between writes of the buffered channel posts
+LIVE_FLUSH_INTERVAL = 10.0
+
+#  Content types of channel service messages, they are not counted as posts
+SERVICE_CONTENT_TYPES = (
+    "pinned_message",
+    "new_chat_title",
+    "new_chat_photo",
+    "delete_chat_photo",
+    "channel_chat_created",
+    "message_auto_delete_timer_changed",
+    "voice_chat_scheduled",
+    "voice_chat_started",
+    "voice_chat_ended",
+    "video_chat_scheduled",
+    "video_chat_started",
+    "video_chat_ended"
+)
+
+
+class LiveIndexer():
+    '''
+    Adds posts of channels where the bot is an admin to the channel index
+    as soon as they are published or edited
+
+    Posts are buffered and written on a timer with one bulk write per channel,
+    so channel counters stay up to date and /getstats doesn't request
+    these posts over MTProto
+
+    :param flushInterval: Seconds between writes
+    '''
+    def __init__(self, flushInterval: float=LIVE_FLUSH_INTERVAL):
+        self.flushInterval = flushInterval
+
+        self._posts: typing.Dict[int, typing.Dict[int, dict]] = {}
+        self._edited: typing.Dict[int, typing.Dict[int, dict]] = {}
+        self._task: asyncio.Task = None
+
+    def add(self, message: types.Message, edited: bool=False):
+        '''
+        Adds channel post to the buffer
+
+        :param message: Channel post
+        :param edited: Whether the post was edited
+        '''
+        chatId = message.chat.id
+        post = self.message_to_document(message)
+
+        if edited and message.message_id not in self._posts.get(chatId, {}):
+            self._edited.setdefault(chatId, {})[message.message_id] = post
+        else:
+            self._posts.setdefault(chatId, {})[message.message_id] = post
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    @staticmethod
+    def message_to_document(message: types.Message) -> dict:
+        '''
+        Creates posts_index document from Bot API message,
+        see post_to_document()
+        '''
+        if message.content_type in SERVICE_CONTENT_TYPES:
+            tags = None
+        else:
+            tags = hashtags_in_text(message)
+
+        return {
+            "chat": message.chat.id,
+            "id": message.message_id,
+            "date": message.date,
+            "group": message.media_group_id,
+            "size": 1,
+            "tags": tags
+        }
+
+    async def _run(self):
+        while self._posts or self._edited:
+            await asyncio.sleep(self.flushInterval)
+            await self.flush()
+
+    @staticmethod
+    def received_ranges(ids: typing.Iterable[int]) -> typing.List[typing.List[int]]:
+        '''
+        Returns ranges of consecutive ids, only these ranges are marked
+        as indexed, since ids between them may have been received
+        by another instance or while the bot was stopped
+        [1, 2, 3, 7, 8] => [[1, 3], [7, 8]]
+        '''
+        return merge_ranges([[messageId, messageId] for messageId in ids])
+
+    async def _write(self, chatId: int, posts: typing.Dict[int, dict], edited: bool):
+        documents = [post for post in posts.values() if post["tags"] is not None]
+        tagsLists = await tagTable.intern_many(post["tags"] for post in documents)
+        documents = [dict(post, tags=tags) for post, tags in zip(documents, tagsLists)]
+
+        if edited:
+            await index_posts(chatId, documents, edited=True)
+        else:
+            await index_posts(chatId, documents, ranges=self.received_ranges(posts))
+
+    async def flush(self):
+        '''
+        Writes buffered posts to the index
+
+        Call it on shutdown to save posts received since the last write,
+        posts of the channels that failed to be written are buffered again
+        '''
+        for buffer, edited in ((self._posts, False), (self._edited, True)):
+            chats = list(buffer)
+
+            for chatId in chats:
+                posts = buffer.pop(chatId)
+
+                try:
+                    await self._write(chatId, posts, edited)
+                except PyMongoError as e:
+                    logger.error(f"LiveIndexer : {e.__class__.__name__} : {e}")
+                    #  Posts received during the write are newer
+                    buffer[chatId] = { **posts, **buffer.get(chatId, {}) }
+
+
+liveIndexer = LiveIndexer()
@@ -0,0 +1,108 @@
+import time
+import typing
+import asyncio
+from collections import OrderedDict
+
+#  Number of results kept in the cache
+RESULT_CACHE_SIZE = 64
+#  Seconds during which a result is returned without scanning the channel again
+RESULT_CACHE_TTL = 600
+#  Seconds between cancellation checks of the waiting jobs
+RESULT_WAIT_INTERVAL = 1.0
+
+
+class ResultCache():
+    '''
+    LRU cache of recent scan results with TTL and single-flight coalescing
+
+    If the same scan is requested while it's running, the request
+    waits for the running scan instead of starting a new one, so many
+    identical /getstats requests result in one scan
+
+    :param size: Number of results stored, the least recently used
+        result is dropped first
+    :param ttl: Seconds after which a result is scanned again
+    '''
+    def __init__(self, size: int=RESULT_CACHE_SIZE, ttl: float=RESULT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+
+        self._results: OrderedDict[typing.Hashable, typing.Tuple[float, typing.Any]] = OrderedDict()
+        self._flights: typing.Dict[typing.Hashable, asyncio.Future] = {}
+
+    def get(self, key: typing.Hashable) -> typing.Any | None:
+        if key not in self._results:
+            return None
+
+        expires, result = self._results[key]
+
+        if expires < time.monotonic():
+            self._results.pop(key)
+            return None
+
+        self._results.move_to_end(key)
+        return result
+
+    def put(self, key: typing.Hashable, result: typing.Any):
+        self._results[key] = (time.monotonic() + self.ttl, result)
+        self._results.move_to_end(key)
+
+        if len(self._results) > self.size:
+            self._results.popitem(last=False)
+
+    async def get_or_compute(
+        self,
+        key: typing.Hashable,
+        compute: typing.Callable[[], typing.Awaitable[typing.Any | None]],
+        cancelled: typing.Callable[[], bool]=None
+    ) -> typing.Any | None:
+        '''
+        Returns cached result, result of the running computation with the same key
+        or computes it
+
+        :param compute: Coroutine function returning the result
+            or None if the computation was cancelled
+        :param cancelled: Function returning whether the caller is cancelled
+            while it waits for the running computation
+
+        If the running computation is cancelled, the result is computed again,
+        cancelled results are not cached
+        '''
+        while True:
+            result = self.get(key)
+            if result is not None:
+                return result
+
+            flight = self._flights.get(key)
+            if flight is None:
+                break
+
+            while not flight.done():
+                if cancelled is not None and cancelled():
+                    return None
+                await asyncio.wait({flight}, timeout=RESULT_WAIT_INTERVAL)
+
+            if not flight.cancelled() and flight.result() is not None:
+                return flight.result()
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+
+        try:
+            result = await compute()
+        except BaseException:
+            #  Waiting jobs compute the result themselves
+            flight.cancel()
+            raise
+        else:
+            flight.set_result(result)
+        finally:
+            self._flights.pop(key, None)
+
+        if result is not None:
+            self.put(key, result)
+
+        return result
+
+
+resultCache = ResultCache()
@@ -0,0 +1,176 @@
+import typing
+import datetime
+from collections import Counter
+from pymongo import UpdateOne, DeleteOne
+from ..resources.mongodb import *
+
+#  Periods of the rollups, see rollup_buckets()
+ROLLUP_PERIODS = ("day", "week", "month")
+
+
+def rollup_buckets(date: datetime.date) -> typing.List[typing.Tuple[str, str]]:
+    '''
+    Returns ( period, bucket ) of the date for every period,
+    weeks are labeled by their monday
+
+    2024-01-03 => [("day", "2024-01-03"), ("week", "2024-01-01"), ("month", "2024-01")]
+    '''
+    monday = date - datetime.timedelta(days=date.weekday())
+    return [
+        ("day", date.strftime("%Y-%m-%d")),
+        ("week", monday.strftime("%Y-%m-%d")),
+        ("month", date.strftime("%Y-%m"))
+    ]
+
+
+def days_ranges(days: typing.List[datetime.date]) -> typing.List[typing.Tuple[datetime.datetime, datetime.datetime]]:
+    '''
+    Returns [ start, end ) datetime ranges of the sorted days,
+    consecutive days are joined into one range
+    '''
+    ranges = []
+
+    for day in days:
+        start = datetime.datetime.combine(day, datetime.time())
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + datetime.timedelta(days=1)
+        else:
+            ranges.append([start, start + datetime.timedelta(days=1)])
+
+    return [tuple(dayRange) for dayRange in ranges]
+
+
+def bucket_days(period: str, bucket: str) -> typing.Tuple[datetime.date, datetime.date]:
+    '''
+    Returns the first and the last day of the week or month bucket
+    '''
+    if period == "week":
+        monday = datetime.datetime.strptime(bucket, "%Y-%m-%d").date()
+        return monday, monday + datetime.timedelta(days=6)
+
+    first = datetime.datetime.strptime(bucket, "%Y-%m").date()
+    nextMonth = (first + datetime.timedelta(days=31)).replace(day=1)
+    return first, nextMonth - datetime.timedelta(days=1)
+
+
+def _rollup_request(chatId: int, period: str, bucket: str, posts: int, tags: Counter) -> UpdateOne | DeleteOne:
+    filter = { "chat": chatId, "period": period, "bucket": bucket }
+
+    if not posts:
+        return DeleteOne(filter)
+
+    return UpdateOne(
+        filter,
+        #  MongoDB keys are strings
+        { "$set": { "posts": posts, "tags": {str(tag): value for tag, value in tags.items() if value} } },
+        upsert=True
+    )
+
+
+async def refresh_rollups(chatId: int, dates: typing.Iterable[datetime.date]):
+    '''
+    Counts rollups of the days of the dates and of their weeks
+    and months again from the indexed posts
+
+    Rollups are replaced instead of incremented, so refreshing them
+    again after a failed write or for the same posts is safe
+
+    Day rollups are counted from posts_index, weeks and months
+    are summed from day rollups
+    '''
+    days = sorted({date.date() if isinstance(date, datetime.datetime) else date for date in dates})
+    if not days:
+        return
+
+    dayPosts = Counter()
+    dayTags = {day.strftime("%Y-%m-%d"): Counter() for day in days}
+
+    cursor = postsIndexCollection.find(
+        {
+            "chat": chatId,
+            "$or": [{ "date": { "$gte": start, "$lt": end } } for start, end in days_ranges(days)]
+        },
+        { "_id": 0, "date": 1, "tags": 1 }
+    )
+
+    async for post in cursor:
+        day = post["date"].strftime("%Y-%m-%d")
+        dayPosts[day] += 1
+        dayTags[day].update(post["tags"])
+
+    await rollupsCollection.bulk_write(
+        [_rollup_request(chatId, "day", day, dayPosts[day], tags) for day, tags in dayTags.items()],
+        ordered=False
+    )
+
+    #  { ( period, bucket ): [ posts, tags ] } of the weeks and months of the days
+    buckets = {
+        bucket: [0, Counter()]
+        for day in days for bucket in rollup_buckets(day)[1:]
+    }
+    bucketsDays = set()
+    for bucket in buckets:
+        first, last = bucket_days(*bucket)
+        bucketsDays.update(first + datetime.timedelta(days=day) for day in range((last - first).days + 1))
+
+    cursor = rollupsCollection.find(
+        {
+            "chat": chatId,
+            "period": "day",
+            "$or": [
+                { "bucket": { "$gte": start.strftime("%Y-%m-%d"), "$lt": end.strftime("%Y-%m-%d") } }
+                for start, end in days_ranges(sorted(bucketsDays))
+            ]
+        },
+        { "_id": 0, "bucket": 1, "posts": 1, "tags": 1 }
+    )
+
+    async for rollup in cursor:
+        day = datetime.datetime.strptime(rollup["bucket"], "%Y-%m-%d")
+
+        for bucket in rollup_buckets(day)[1:]:
+            if bucket in buckets:
+                buckets[bucket][0] += rollup.get("posts", 0)
+                buckets[bucket][1].update({int(tag): value for tag, value in rollup.get("tags", {}).items()})
+
+    await rollupsCollection.bulk_write(
+        [
+            _rollup_request(chatId, period, bucket, posts, tags)
+            for (period, bucket), (posts, tags) in buckets.items()
+        ],
+        ordered=False
+    )
+
+
+async def get_rollups(
+    chatId: int,
+    period: str,
+    start: datetime.datetime,
+    end: datetime.datetime
+) -> typing.List[dict]:
+    '''
+    Returns rollups of the channel for buckets from start to end ordered by bucket
+    { "bucket": bucket, "posts": posts, "tags": { tag id: posts } }
+
+    Buckets are whole periods, so the first and the last ones
+    include all indexed posts of these periods
+    '''
+    buckets = dict(rollup_buckets(start)), dict(rollup_buckets(end))
+
+    cursor = rollupsCollection.find(
+        {
+            "chat": chatId,
+            "period": period,
+            "bucket": { "$gte": buckets[0][period], "$lte": buckets[1][period] }
+        },
+        { "_id": 0, "bucket": 1, "posts": 1, "tags": 1 }
+    ).sort("bucket", 1)
+
+    return [
+        {
+            "bucket": document["bucket"],
+            "posts": document.get("posts", 0),
+            "tags": {int(tag): value for tag, value in document.get("tags", {}).items() if value > 0}
+        }
+        async for document in cursor
+    ]
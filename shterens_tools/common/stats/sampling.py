@@ -0,0 +1,162 @@
+import math
+import random
+import typing
+from .scanner import *
+from .accumulator import *
+
+#  Number of windows scanned by /getstats sample without a number
+SAMPLE_WINDOWS = 30
+#  z-score of the confidence intervals, 95%
+SAMPLE_CONFIDENCE_Z = 1.96
+
+
+def sample_windows(
+    startId: int,
+    endId: int,
+    windows: int,
+    windowSize: int=MESSAGES_WINDOW_SIZE,
+    stratified: bool=True
+) -> typing.List[typing.Tuple[int, int]]:
+    '''
+    Returns ( startId, endId ) of randomly selected windows of ids ordered by id
+
+    :param windows: Number of windows
+    :param stratified: Select one window in each of windows equal parts
+        of the range, otherwise select windows anywhere in the range
+
+    If the range is too small, it's returned as a single window
+    '''
+    size = endId - startId + 1
+
+    if size <= windows * windowSize:
+        return [(startId, endId)]
+
+    if stratified:
+        stratum = size / windows
+        starts = [
+            startId + int(number * stratum) + random.randint(0, int(stratum) - windowSize)
+            for number in range(windows)
+        ]
+    else:
+        starts = sorted(
+            startId + windowSize * number
+            for number in random.sample(range(size // windowSize), windows)
+        )
+
+    return [(start, start + windowSize - 1) for start in starts]
+
+
+class SampleEstimate():
+    '''
+    Estimates of the number of posts and tags in the range
+    from the posts of sampled windows
+
+    Windows are treated as a sample of clusters, totals are estimated
+    by the mean density of the windows, so confidence intervals shrink
+    with the number of windows
+
+    :param rangeSize: Number of ids in the range
+    '''
+    def __init__(self, rangeSize: int):
+        self.rangeSize = rangeSize
+        self.sampledIds = 0
+        #  Window sizes, numbers of posts and tags in every sampled window
+        self._sizes: typing.List[int] = []
+        self._posts: typing.List[int] = []
+        self._tags: typing.List[typing.Dict[str, int]] = []
+
+    def add_window(self, size: int, stats: StatsAccumulator):
+        self.sampledIds += size
+        self._sizes.append(size)
+        self._posts.append(stats.count)
+        self._tags.append(stats.tags)
+
+    @property
+    def exact(self) -> bool:
+        return self.sampledIds >= self.rangeSize
+
+    def _estimate(self, values: typing.List[int]) -> typing.Tuple[int, int]:
+        '''
+        Returns ( estimate, margin of error ) of the total
+        from the values counted in every window
+        '''
+        if self.exact:
+            return sum(values), 0
+
+        densities = [value / size for value, size in zip(values, self._sizes)]
+        windows = len(densities)
+        mean = sum(densities) / windows
+
+        if windows > 1:
+            variance = sum((density - mean) ** 2 for density in densities) / (windows - 1)
+        else:
+            variance = 0.0
+
+        #  Finite population correction, a large share of ids is sampled
+        correction = max(0.0, 1 - self.sampledIds / self.rangeSize)
+        margin = SAMPLE_CONFIDENCE_Z * self.rangeSize * math.sqrt(variance / windows * correction)
+
+        return round(mean * self.rangeSize), math.ceil(margin)
+
+    @property
+    def posts(self) -> typing.Tuple[int, int]:
+        '''
+        Estimated number of posts and its margin of error
+        '''
+        return self._estimate(self._posts)
+
+    @property
+    def tags(self) -> typing.Dict[str, typing.Tuple[int, int]]:
+        '''
+        Estimated number of posts for every sampled tag and its margin of error
+        '''
+        names = set()
+        for windowTags in self._tags:
+            names.update(windowTags)
+
+        return {
+            tag: self._estimate([windowTags.get(tag, 0) for windowTags in self._tags])
+            for tag in names
+        }
+
+
+async def sample_range(
+    chatId: int,
+    startId: int,
+    endId: int,
+    windows: int=SAMPLE_WINDOWS,
+    onProgress: typing.Callable[[int], typing.Awaitable[bool]]=None,
+    tagFilter: TagFilter=None
+) -> typing.Tuple[SampleEstimate, StatsAccumulator] | None:
+    '''
+    Scans random windows of the range with ChannelScanner
+
+    :param windows: Number of windows, see sample_windows()
+    :param onProgress: Coroutine function called with the number of processed ids,
+        returns False if sampling must be stopped
+    :param tagFilter: Estimate only tags matching the filter
+
+    Scanned windows are added to the channel index like any other scan
+
+    Returns estimate and merged stats of the sampled posts
+    or None if sampling was stopped
+    '''
+    estimate = SampleEstimate(endId - startId + 1)
+    sampled = StatsAccumulator()
+
+    async def on_progress(done: int) -> bool:
+        if onProgress is None:
+            return True
+        return await onProgress(done)
+
+    for windowStart, windowEnd in sample_windows(startId, endId, windows):
+        stats = StatsAccumulator()
+        scanner = ChannelScanner(chatId, stats, on_progress, tagFilter)
+
+        if not await scanner.scan(windowStart, windowEnd):
+            return None
+
+        estimate.add_window(windowEnd - windowStart + 1, stats)
+        sampled.merge(stats)
+
+    return estimate, sampled
@@ -0,0 +1,254 @@
+import typing
+import asyncio
+import datetime
+from contextlib import aclosing
+from .index import *
+from .tags import *
+from .filters import *
+from .warehouse import *
+from .accumulator import *
+from ..apis.mtprotoapi import *
+from ..utils.regex import hashtags_in_text
+
+
+class ChannelScanner():
+    '''
+    Collects hashtags statistics for a range of channel posts
+
+    Ranges that are already in the channel index are read from MongoDB,
+    the rest is requested over MTProto and added to the index, so repeated
+    scans of the same channel only request new posts. If the range contains
+    the whole index, tags are taken from the channel counters
+
+    :param chatId: Id of the channel
+    :param stats: Stats to collect in
+    :param onProgress: Coroutine function called with the number of processed ids,
+        returns False if the scan must be stopped
+    :param tagFilter: Count only tags matching the filter, posts are
+        added to the index with all tags
+
+    Dates are taken from the scanned posts, so the result
+    doesn't need any extra requests
+    '''
+    def __init__(
+        self,
+        chatId: int,
+        stats: StatsAccumulator,
+        onProgress: typing.Callable[[int], typing.Awaitable[bool]],
+        tagFilter: TagFilter=None
+    ):
+        self.chatId = chatId
+        self.stats = stats
+        self.onProgress = onProgress
+        self.tagFilter = tagFilter
+
+        #  Last processed message id and album id, they are
+        #  saved in job checkpoints to continue the scan
+        self.lastId: int = None
+        self.lastGroup: str = None
+        #  First counted post ( id, tags, album id, date ), it's needed to merge
+        #  stats of adjacent ranges split in the middle of an album
+        self.firstPost: typing.Tuple[int, typing.List[str], str, datetime.datetime] = None
+        #  { message id: tag ids } of the received windows, see _intern_window()
+        self._windowTags: typing.Dict[int, typing.List[int]] = {}
+        self._windowGroup: str = None
+
+    async def scan(self, startId: int, endId: int) -> bool:
+        '''
+        Scans posts from startId to endId
+
+        Returns whether the scan was completed
+        '''
+        if startId > endId:
+            return True
+
+        #  Indexed posts can have tags added after the filter was compiled
+        if self.tagFilter:
+            await self.tagFilter.refresh()
+
+        channel = await get_channel_index(self.chatId)
+
+        if is_whole_index(channel, startId, endId):
+            return await self._scan_counters(channel, startId, endId)
+
+        for segmentStart, segmentEnd, isIndexed in split_range(channel["ranges"], startId, endId):
+            if isIndexed:
+                completed = await self._scan_index(segmentStart, segmentEnd)
+            else:
+                completed = await self._scan_history(segmentStart, segmentEnd)
+
+            if not completed:
+                return False
+
+        return True
+
+    def _count_post(
+        self,
+        messageId: int,
+        tags: typing.List[str],
+        group: str | None,
+        date: datetime.datetime
+    ):
+        #  Album parts can be stored in the index as separate posts
+        if group is not None and group == self.lastGroup:
+            return
+
+        self.lastGroup = group
+
+        if self.tagFilter:
+            tags = self.tagFilter.apply(tags)
+
+        self.stats.add_post(messageId, tags, date)
+
+        if self.firstPost is None:
+            self.firstPost = (messageId, tags, group, date)
+
+    async def _scan_counters(self, channel: dict, startId: int, endId: int) -> bool:
+        if self.stats.postIds is not None:
+            return await self._scan_index(startId, endId)
+        
+        if self.stats.histogram:
+            warehouse = await get_warehouse(self.chatId)
+            days = warehouse.slice_ids(startId, endId).histogram("day")
+        else:
+            days = None
+
+        tags = {tag: value for tag, value in channel["tags"].items() if value > 0}
+        if self.tagFilter:
+            tags = self.tagFilter.apply_counts(tags)
+
+        self.stats.add_range(
+            channel["firstId"],
+            channel["lastId"],
+            channel["posts"],
+            channel["firstDate"],
+            channel["lastDate"],
+            tags,
+            days
+        )
+
+        if self.firstPost is None:
+            self.firstPost = (channel["firstId"], [], None, channel["firstDate"])
+
+        self.lastId = endId
+        return await self.onProgress(endId-startId+1)
+
+    async def _scan_index(self, startId: int, endId: int) -> bool:
+        async for post in iter_indexed_posts(self.chatId, startId, endId):
+            self._count_post(post["id"], post["tags"], post["group"], post["date"])
+            await asyncio.sleep(0)
+
+        self.lastId = endId
+        return await self.onProgress(endId-startId+1)
+
+    async def _intern_window(self, messages: typing.List[pyrogram.types.Message]):
+        '''
+        Interns tags of all posts of the window at once
+        '''
+        posts = []
+
+        for message in map(MTProtoMessage, messages):
+            group = message.media_group_id
+
+            #  Only the first message of an album is counted, see iter_channel_posts()
+            if (group is None or group != self._windowGroup) and not message.empty and not message.is_service_message():
+                posts.append(message)
+
+            self._windowGroup = group
+
+        tagsLists = await tagTable.intern_many(hashtags_in_text(message) for message in posts)
+
+        for message, tags in zip(posts, tagsLists):
+            self._windowTags[message.id] = tags
+
+        #  Tags of the filter can be seen for the first time
+        if self.tagFilter:
+            self.tagFilter.resolve()
+
+    async def _scan_history(self, startId: int, endId: int) -> bool:
+        posts = []
+        indexedId = startId - 1
+        self._windowTags = {}
+        self._windowGroup = None
+
+        #  Stop requesting windows in the background if the scan is stopped
+        async with aclosing(iter_channel_posts(self.chatId, startId, endId, onWindow=self._intern_window)) as history:
+            async for post in history:
+                message = MTProtoMessage(post[0])
+
+                if not message.empty and not message.is_service_message():
+                    tags = self._windowTags.pop(message.id)
+                    self._count_post(message.id, tags, message.media_group_id, message.date)
+                    posts.append(post_to_document(self.chatId, message, tags, len(post)))
+
+                lastId = post[-1].id
+                self.lastId = lastId
+
+                if lastId - indexedId >= INDEX_FLUSH_SIZE:
+                    await index_posts(self.chatId, posts, indexedId+1, lastId)
+                    posts = []
+                    indexedId = lastId
+
+                if not await self.onProgress(len(post)):
+                    #  Save what has been scanned before stopping
+                    if lastId > indexedId:
+                        await index_posts(self.chatId, posts, indexedId+1, lastId)
+                    return False
+
+                await asyncio.sleep(0)
+
+        if endId > indexedId:
+            await index_posts(self.chatId, posts, indexedId+1, endId)
+
+        return True
+
+
+def merge_scan_results(results: typing.List[dict]) -> dict:
+    '''
+    Merges results of adjacent ranges scans ordered by range
+
+    :param results: Dictionaries { "stats": StatsAccumulator,
+        "first": scanner.firstPost, "group": scanner.lastGroup }
+
+    If an album is split between two ranges, it's counted once
+    '''
+    merged = {"stats": None, "first": None, "group": None}
+
+    for result in results:
+        stats = result["stats"]
+
+        if merged["stats"] is None:
+            merged["stats"] = StatsAccumulator(stats.histogram, stats.postIds is not None, stats.topK)
+
+        if result["first"] is None:
+            continue
+
+        firstId, firstTags, firstGroup, firstDate = result["first"]
+
+        if firstGroup is not None and firstGroup == merged["group"]:
+            stats.discard_first(firstTags, firstDate)
+
+        if not stats.count:
+            continue
+
+        if merged["first"] is None:
+            merged["first"] = result["first"]
+
+        merged["stats"].merge(stats)
+        merged["group"] = result["group"]
+
+    return merged
+
+
+def scan_result_to_document(result: dict) -> dict:
+    '''
+    Converts scan result to MongoDB document for job checkpoints and results
+    '''
+    return dict(result, stats=result["stats"].to_document())
+
+
+def scan_result_from_document(document: dict) -> dict:
+    '''
+    Restores scan result saved with scan_result_to_document()
+    '''
+    return dict(document, stats=StatsAccumulator.from_document(document["stats"]))
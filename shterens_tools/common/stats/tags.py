@@ -0,0 +1,176 @@
+import typing
+from collections import OrderedDict
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from ..resources.mongodb import *
+
+#  Number of tags cached in the process
+TAG_CACHE_SIZE = 100000
+
+
+def normalize_tag(tag: str) -> str:
+    '''
+    Returns tag without # in lower case for case-insensitive matching
+    '''
+    return tag.lstrip("#").casefold()
+
+
+class TagTable():
+    '''
+    Global dictionary of normalized tags and their integer ids
+
+    Tags are matched by the normalized form, see normalize_tag(),
+    and shown as they were written when they were seen first
+
+    Tags are stored in the tags collection and cached in the process,
+    so the index, counters and caches keep ints instead of strings
+    and the same tag has the same id in every channel
+
+    Ids are allocated in blocks with $inc of the tags counter,
+    if two instances add the same tag at once, the id of the first
+    inserted document is used by both
+
+    :param size: Number of cached tags, the least recently used
+        tag is dropped first
+    '''
+    def __init__(self, size: int=TAG_CACHE_SIZE):
+        self.size = size
+
+        self._ids: OrderedDict[str, int] = OrderedDict()
+        #  { id: ( normalized tag, tag as it's shown ) }
+        self._names: typing.Dict[int, typing.Tuple[str, str]] = {}
+
+    def _cache(self, document: dict):
+        tag, tagId = document["tag"], document["_id"]
+        self._ids[tag] = tagId
+        self._ids.move_to_end(tag)
+        self._names[tagId] = (tag, document.get("name", tag))
+
+        if len(self._ids) > self.size:
+            _, oldId = self._ids.popitem(last=False)
+            self._names.pop(oldId, None)
+
+    def cached(self, tag: str) -> int | None:
+        '''
+        Returns id of the normalized tag if it's cached
+        '''
+        tagId = self._ids.get(tag)
+        if tagId is not None:
+            self._ids.move_to_end(tag)
+        return tagId
+
+    async def _load(self, tags: typing.Iterable[str]) -> typing.Dict[str, int]:
+        found = {}
+        async for document in tagsCollection.find({ "tag": { "$in": list(tags) } }, { "tag": 1, "name": 1 }):
+            self._cache(document)
+            found[document["tag"]] = document["_id"]
+        return found
+
+    async def _create(self, tags: typing.Dict[str, str]) -> typing.Dict[str, int]:
+        '''
+        Adds { normalized tag: tag as it's shown } to the table
+        '''
+        counter = await countersCollection.find_one_and_update(
+            { "_id": "tags" },
+            { "$inc": { "value": len(tags) } },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        firstId = counter["value"] - len(tags) + 1
+
+        try:
+            await tagsCollection.insert_many(
+                [
+                    { "_id": firstId + number, "tag": tag, "name": name }
+                    for number, (tag, name) in enumerate(tags.items())
+                ],
+                ordered=False
+            )
+        except BulkWriteError:
+            #  Some tags have been added by another instance
+            pass
+
+        return await self._load(tags)
+
+    async def lookup(self, tags: typing.Iterable[str]) -> typing.Dict[str, int]:
+        '''
+        Returns { normalized tag: id } for the tags found in the table,
+        unknown tags aren't added
+        '''
+        ids = {}
+        missing = []
+
+        for tag in dict.fromkeys(map(normalize_tag, tags)):
+            tagId = self.cached(tag)
+            if tagId is None:
+                missing.append(tag)
+            else:
+                ids[tag] = tagId
+
+        if missing:
+            ids.update(await self._load(missing))
+
+        return ids
+
+    async def intern(self, tags: typing.Iterable[str]) -> typing.List[int]:
+        '''
+        Returns unique ids of the tags, new tags are added to the table
+        '''
+        return (await self.intern_many([tags]))[0]
+
+    async def intern_many(self, tagsLists: typing.Iterable[typing.Iterable[str]]) -> typing.List[typing.List[int]]:
+        '''
+        Returns unique ids of the tags of every list, tags of all lists
+        are looked up and added to the table at once, so a window
+        of posts costs at most one lookup and one insert
+        '''
+        tagsLists = [list(tags) for tags in tagsLists]
+        #  { normalized tag: the first spelling }
+        names = {}
+        for tags in tagsLists:
+            for tag in tags:
+                names.setdefault(normalize_tag(tag), tag.lstrip("#"))
+
+        tagsLists = [[normalize_tag(tag) for tag in tags] for tags in tagsLists]
+        ids = {}
+        missing = []
+
+        for tag in names:
+            tagId = self.cached(tag)
+            if tagId is None:
+                missing.append(tag)
+            else:
+                ids[tag] = tagId
+
+        if missing:
+            ids.update(await self._load(missing))
+            missing = [tag for tag in missing if tag not in ids]
+
+        if missing:
+            ids.update(await self._create({tag: names[tag] for tag in missing}))
+
+        return [list(dict.fromkeys(ids[tag] for tag in tags)) for tags in tagsLists]
+
+    async def names(self, tagIds: typing.Iterable[int]) -> typing.Dict[int, str]:
+        '''
+        Returns { id: tag as it's shown } for the tag ids
+        '''
+        names = {}
+        missing = []
+
+        for tagId in dict.fromkeys(tagIds):
+            if tagId in self._names:
+                tag, names[tagId] = self._names[tagId]
+                self.cached(tag)
+            else:
+                missing.append(tagId)
+
+        if missing:
+            async for document in tagsCollection.find({ "_id": { "$in": missing } }, { "tag": 1, "name": 1 }):
+                self._cache(document)
+                names[document["_id"]] = document.get("name", document["tag"])
+
+        return names
+
+
+tagTable = TagTable()
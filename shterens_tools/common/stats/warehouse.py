@@ -0,0 +1,238 @@
+import os
+import json
+import typing
+import asyncio
+import datetime
+import tempfile
+import numpy as np
+from .index import *
+from ..resources.paths import *
+
+#  Columns of the channel warehouse saved as .npy files
+WAREHOUSE_COLUMNS = ("ids", "dates", "tags")
+#  Tag id of the rows of posts without tags
+NO_TAG = 0
+
+
+class ChannelWarehouse():
+    '''
+    Columnar copy of the channel index for aggregations with NumPy
+
+    Every post is stored as rows of ( message id, date, tag id ) ordered
+    by message id, one row per tag or one row with NO_TAG if the post
+    has no tags. Columns are memory-mapped, so loading is free and slices
+    are views. Saved columns are updated only with the changed posts,
+    see get_warehouse()
+
+    :param chatId: Id of the channel
+    :param ids: int64 message ids
+    :param dates: datetime64[s] dates of the posts
+    :param tags: int64 tag ids, see tagTable
+    '''
+    __slots__ = ("chatId", "ids", "dates", "tags")
+
+    def __init__(self, chatId: int, ids: np.ndarray, dates: np.ndarray, tags: np.ndarray):
+        self.chatId = chatId
+        self.ids = ids
+        self.dates = dates
+        self.tags = tags
+
+    def _slice(self, start: int, end: int) -> "ChannelWarehouse":
+        return ChannelWarehouse(self.chatId, self.ids[start:end], self.dates[start:end], self.tags[start:end])
+
+    def slice_ids(self, startId: int, endId: int) -> "ChannelWarehouse":
+        '''
+        Returns posts from startId to endId
+        '''
+        return self._slice(
+            np.searchsorted(self.ids, startId, "left"),
+            np.searchsorted(self.ids, endId, "right")
+        )
+
+    def replace_posts(self, posts: typing.List[dict]) -> "ChannelWarehouse":
+        '''
+        Returns warehouse in which rows of the posts are replaced
+        with their new versions, new posts are added and rows
+        of the album parts merged into the posts are removed
+        '''
+        ids, dates, tags = posts_to_rows(posts)
+        parts = [partId for post in posts for partId in post.get("parts", [])]
+        kept = ~np.isin(self.ids, np.concatenate((ids, np.array(parts, dtype=np.int64))))
+
+        ids = np.concatenate((self.ids[kept], ids))
+        order = np.argsort(ids, kind="stable")
+
+        return ChannelWarehouse(
+            self.chatId,
+            ids[order],
+            np.concatenate((self.dates[kept], dates))[order],
+            np.concatenate((self.tags[kept], tags))[order]
+        )
+
+    def _first_rows(self) -> np.ndarray:
+        '''
+        Returns mask of the first row of every post
+        '''
+        mask = np.ones(len(self.ids), dtype=bool)
+        mask[1:] = self.ids[1:] != self.ids[:-1]
+        return mask
+
+    @property
+    def posts(self) -> int:
+        return int(np.count_nonzero(self._first_rows()))
+
+    def histogram(self, period: str="day", tag: int=None) -> typing.Dict[str, int]:
+        '''
+        Returns number of posts per period { "YYYY-MM-DD" or "YYYY-MM": posts }
+
+        :param period: "day", "week" (labeled by monday) or "month"
+        :param tag: Count only posts with the tag
+        '''
+        mask = self.tags == tag if tag is not None else self._first_rows()
+        return dict(zip(*bucket_counts(self.dates[mask], period)))
+
+
+def bucket_counts(dates: np.ndarray, period: str) -> typing.Tuple[typing.List[str], typing.List[int]]:
+    '''
+    Returns labels of the periods and number of dates in each of them
+    '''
+    if period == "month":
+        buckets = dates.astype("datetime64[M]")
+    else:
+        buckets = dates.astype("datetime64[D]")
+        if period == "week":
+            #  1970-01-01 is thursday, so days are shifted to mondays
+            days = buckets.astype(np.int64)
+            buckets = (days - (days + 3) % 7).astype("datetime64[D]")
+
+    buckets, counts = np.unique(buckets, return_counts=True)
+    return np.datetime_as_string(buckets).tolist(), counts.tolist()
+
+
+def _channel_path(chatId: int) -> str:
+    return os.path.join(warehousePath, str(chatId))
+
+
+def posts_to_rows(posts: typing.List[dict]) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Returns ids, dates and tags columns of posts_index documents
+    '''
+    ids, dates, tags = [], [], []
+
+    for post in posts:
+        for tag in post["tags"] or (NO_TAG, ):
+            ids.append(post["id"])
+            dates.append(post["date"])
+            tags.append(tag)
+
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array(dates, dtype="datetime64[s]"),
+        np.array(tags, dtype=np.int64)
+    )
+
+
+def _load(chatId: int) -> typing.Tuple[ChannelWarehouse, str] | None:
+    '''
+    Returns saved warehouse and the channel index update time it includes
+    '''
+    path = _channel_path(chatId)
+
+    try:
+        with open(os.path.join(path, "meta.json")) as metaFile:
+            updated = json.load(metaFile)["indexUpdated"]
+
+        columns = [np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r") for column in WAREHOUSE_COLUMNS]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    #  Files are being replaced by another instance
+    if len({len(column) for column in columns}) != 1:
+        return None
+
+    return ChannelWarehouse(chatId, *columns), updated
+
+
+def _replace_file(path: str, name: str, write: typing.Callable[[typing.BinaryIO], None]):
+    '''
+    Writes the file to a unique temporary file and moves it to the name,
+    so instances saving the same channel don't write to one file
+    '''
+    descriptor, temporaryPath = tempfile.mkstemp(dir=path, suffix=".tmp")
+
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            write(file)
+        os.replace(temporaryPath, os.path.join(path, name))
+    except BaseException:
+        os.unlink(temporaryPath)
+        raise
+
+
+def _save(warehouse: ChannelWarehouse, updated: str | None):
+    '''
+    Replaces files of the channel, each file is replaced atomically
+    and the metadata is written last
+    '''
+    path = _channel_path(warehouse.chatId)
+    os.makedirs(path, exist_ok=True)
+
+    for column in WAREHOUSE_COLUMNS:
+        _replace_file(path, f"{column}.npy", lambda file: np.save(file, getattr(warehouse, column)))
+
+    meta = json.dumps({ "indexUpdated": updated }).encode()
+    _replace_file(path, "meta.json", lambda file: file.write(meta))
+
+
+async def _read_posts(chatId: int, updatedSince: datetime.datetime=None) -> typing.List[dict]:
+    '''
+    Reads indexed posts of the channel ordered by id,
+    only posts changed since updatedSince if it's passed
+    '''
+    query = { "chat": chatId }
+    if updatedSince is not None:
+        query["updated"] = { "$gte": updatedSince }
+
+    cursor = postsIndexCollection.find(
+        query,
+        { "_id": 0, "id": 1, "date": 1, "tags": 1, "parts": 1 }
+    ).sort("id", 1)
+    return await cursor.to_list(None)
+
+
+async def build_warehouse(chatId: int) -> ChannelWarehouse:
+    '''
+    Reads all indexed posts of the channel into columns
+    '''
+    return ChannelWarehouse(chatId, *posts_to_rows(await _read_posts(chatId)))
+
+
+async def get_warehouse(chatId: int) -> ChannelWarehouse:
+    '''
+    Returns warehouse of the channel
+
+    Posts are stamped with the time of their last change, so the saved
+    warehouse is updated only with posts changed since the channel
+    index update time it includes, it's built from all posts only once
+
+    Update time of the channel is read before the posts, so posts
+    written during the read are read again on the next call
+    '''
+    channel = await channelsIndexCollection.find_one({ "_id": chatId }, { "updated": 1 })
+    updated = channel.get("updated") if channel is not None else None
+
+    saved = await asyncio.to_thread(_load, chatId)
+
+    if saved is not None and saved[1] == (updated and updated.isoformat()):
+        return saved[0]
+
+    if saved is not None and saved[1] is not None:
+        posts = await _read_posts(chatId, datetime.datetime.fromisoformat(saved[1]))
+        warehouse = saved[0].replace_posts(posts)
+    else:
+        warehouse = await build_warehouse(chatId)
+
+    #  Saved files are replaced, so they must not be mapped
+    saved = None
+    await asyncio.to_thread(_save, warehouse, updated and updated.isoformat())
+    return warehouse
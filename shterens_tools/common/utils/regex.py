@@ -2,7 +2,8 @@ import re
 import typing
 import random
 from uuid import UUID
-from ..apis.mtprotoapi import pyrogram
+import pyrogram
+from aiogram import types
 from string import ascii_lowercase
 
 usernamePattern = re.compile("^@[a-zA-Z][a-zA-Z0-9_]{4,}$")
@@ -14,6 +15,11 @@ hashtagPattern = re.compile("(\s#+|\s|^)(#[^\s#:;,?.*$%\"@!+^()=№<>`~[\]{\}\-\
 publicMessagePattern = re.compile("^http[s]?:\/\/t.me\/[a-zA-Z][a-zA-Z0-9_]{4,}\/[1-9][0-9]*$")
 privateMessagePattern = re.compile("^http[s]?:\/\/t.me\/c\/[1-9][0-9]{9}\/[1-9][0-9]*$")
 
+#  Hashtag entity type in Pyrogram and Bot API messages
+hashtagEntityTypes = (pyrogram.enums.MessageEntityType.HASHTAG, "hashtag")
+
+datePattern = re.compile("^[0-9]{1,2}\.[0-9]{1,2}\.[0-9]{4}$")
+
 
 def is_link(text: str) -> bool:
     return re.match(linkPattern, text)
@@ -27,6 +33,10 @@ def is_invite(text: str) -> bool:
     return re.match(invitePattern, text)
 
 
+def is_date(text: str) -> bool:
+    return re.match(datePattern, text)
+
+
 def link_to_username(link: str) -> str:
     return re.sub("http[s]?:\/\/t.me\/", "@", link, 1)
 
@@ -43,14 +53,60 @@ def oneliner_to_multiliner(oneliner: str) -> str:
     return "\n".join(re.split(";[ ]*", oneliner))
 
 
-def hashtags_in_text(message: pyrogram.types.Message) -> list:
+def hashtags_in_text(message: pyrogram.types.Message | types.Message) -> list:
+    '''
+    Returns unique hashtags of the message text or caption without #
+
+    Hashtags are sliced from the message entities, the regex
+    is used only if Telegram hasn't sent entities
+    '''
     if message.text:
-        text = message.text
+        text, entities = message.text, message.entities
     elif message.caption:
-        text = message.caption
+        text, entities = message.caption, message.caption_entities
     else:
-        text = ""
+        return []
+
+    #  Most posts have no tags
+    if "#" not in text:
+        return []
+
+    if entities is None:
+        return hashtags_in_text_regex(text)
+
+    return hashtags_in_entities(text, entities)
+
+
+def hashtags_in_entities(
+    text: str,
+    entities: typing.List[pyrogram.types.MessageEntity | types.MessageEntity]
+) -> list:
+    '''
+    Returns unique hashtags without # sliced from text by hashtag entities
+
+    Entity offsets are counted in UTF-16 code units, so non-ASCII text
+    is sliced in its UTF-16 encoding
+    '''
+    hashtags = {}
+    encoded = None
+
+    for entity in entities:
+        if entity.type not in hashtagEntityTypes:
+            continue
+
+        if text.isascii():
+            hashtag = text[entity.offset+1:entity.offset+entity.length]
+        else:
+            if encoded is None:
+                encoded = text.encode("utf-16-le")
+            hashtag = encoded[(entity.offset+1)*2:(entity.offset+entity.length)*2].decode("utf-16-le")
+
+        hashtags[hashtag] = None
+
+    return list(hashtags)
+
 
+def hashtags_in_text_regex(text: str) -> list:
     hashtags = []
 
     for item in re.findall(hashtagPattern, text):
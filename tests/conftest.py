@@ -0,0 +1,28 @@
+import sys
+import pytest
+
+
+@pytest.fixture
+def db(monkeypatch):
+    '''
+    In-memory MongoDB database used by the shterens_tools collections
+    '''
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient().shterens_tools
+    collections = {
+        "usersCollection": database.users,
+        "channelsIndexCollection": database.channels_index,
+        "postsIndexCollection": database.posts_index,
+        "jobsCollection": database.jobs,
+        "tagsCollection": database.tags,
+        "countersCollection": database.counters,
+        "rollupsCollection": database.rollups
+    }
+
+    for module in list(sys.modules.values()):
+        if getattr(module, "__name__", "").startswith("shterens_tools"):
+            for name, collection in collections.items():
+                if hasattr(module, name):
+                    monkeypatch.setattr(module, name, collection)
+
+    return database
@@ -0,0 +1,86 @@
+import datetime
+from shterens_tools.common.stats.accumulator import StatsAccumulator
+
+
+def day(number, hour=12):
+    return datetime.datetime(2024, 1, number, hour)
+
+
+def accumulator_of(posts, **kwargs):
+    stats = StatsAccumulator(**kwargs)
+    for messageId, tags, date in posts:
+        stats.add_post(messageId, tags, date)
+    return stats
+
+
+FIRST = [(1, [10, 11], day(1)), (2, [10], day(1)), (3, [], day(2))]
+SECOND = [(4, [11, 12], day(2)), (5, [10], day(3))]
+
+
+def test_add_post():
+    stats = accumulator_of(FIRST, histogram=True)
+
+    assert (stats.first, stats.last, stats.count) == (1, 3, 3)
+    assert (stats.firstDate, stats.lastDate) == (day(1), day(2))
+    assert stats.tags == {10: 2, 11: 1}
+    assert stats.days == {"2024-01-01": 2, "2024-01-02": 1}
+
+
+def test_merge():
+    stats = accumulator_of(FIRST, histogram=True, keepPosts=True)
+    stats.merge(accumulator_of(SECOND, histogram=True, keepPosts=True))
+    expected = accumulator_of(FIRST + SECOND, histogram=True, keepPosts=True)
+
+    assert (stats.first, stats.last, stats.count) == (1, 5, 5)
+    assert (stats.firstDate, stats.lastDate) == (day(1), day(3))
+    assert stats.tags == expected.tags
+    assert stats.days == expected.days
+    assert list(stats.postIds) == [1, 2, 3, 4, 5]
+    assert list(stats.postDates) == list(expected.postDates)
+
+
+def test_merge_into_empty():
+    stats = StatsAccumulator()
+    stats.merge(accumulator_of(SECOND))
+    stats.merge(StatsAccumulator())
+
+    assert (stats.first, stats.last, stats.count) == (4, 5, 2)
+    assert stats.tags == {10: 1, 11: 1, 12: 1}
+
+
+def test_merge_top_k():
+    stats = accumulator_of(FIRST, topK=2)
+    stats.merge(accumulator_of(SECOND, topK=2))
+
+    assert stats.count == 5
+    assert stats.heavyHitters.total == 6
+    assert stats.tags == {10: 3, 11: 2, 12: 1}
+
+
+def test_discard_first():
+    #  Album split between two scans is counted by both of them
+    stats = accumulator_of([(3, [12], day(2))] + SECOND, histogram=True, keepPosts=True)
+    stats.discard_first([12], day(2))
+
+    assert stats.count == 2
+    assert stats.tags == {10: 1, 11: 1, 12: 1}
+    assert stats.days == {"2024-01-02": 1, "2024-01-03": 1}
+    assert list(stats.postIds) == [4, 5]
+
+
+def test_discard_first_removes_empty_day():
+    stats = accumulator_of([(1, [10], day(1))] + SECOND, histogram=True)
+    stats.discard_first([10], day(1))
+
+    assert "2024-01-01" not in stats.days
+    assert stats.tags == {10: 1, 11: 1, 12: 1}
+
+
+def test_document_round_trip():
+    stats = accumulator_of(FIRST, histogram=True, keepPosts=True)
+    restored = StatsAccumulator.from_document(stats.to_document())
+
+    assert (restored.first, restored.last, restored.count) == (1, 3, 3)
+    assert restored.tags == stats.tags
+    assert restored.days == stats.days
+    assert list(restored.postIds) == list(stats.postIds)
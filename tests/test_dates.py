@@ -0,0 +1,114 @@
+import random
+import asyncio
+import datetime
+from types import SimpleNamespace
+import pytest
+from shterens_tools.common.stats import dates
+from shterens_tools.common.stats.dates import DateAnchors, _search, get_last_post_id, resolve_date
+
+
+START = datetime.datetime(2024, 1, 1)
+
+
+class FakeChannel():
+    '''
+    Channel of posts published one hour apart, deleted ids
+    are returned as empty messages like get_messages does
+    '''
+    def __init__(self, lastId: int, deleted=()):
+        self.posts = {
+            messageId: START + datetime.timedelta(hours=messageId)
+            for messageId in range(1, lastId+1)
+            if messageId not in deleted
+        }
+        self.requests = 0
+
+    async def get_messages_window(self, chatId: int, startId: int, endId: int):
+        assert endId - startId + 1 <= dates.MESSAGES_WINDOW_SIZE
+        self.requests += 1
+
+        return [
+            SimpleNamespace(id=messageId, empty=False, service=False, date=self.posts[messageId])
+            if messageId in self.posts else
+            SimpleNamespace(id=messageId, empty=True, service=False, date=None)
+            for messageId in range(startId, endId+1)
+        ]
+
+
+@pytest.fixture
+def channel(monkeypatch):
+    def create(lastId: int, deleted=()) -> FakeChannel:
+        fake = FakeChannel(lastId, deleted)
+        monkeypatch.setattr(dates, "get_messages_window", fake.get_messages_window)
+        return fake
+
+    monkeypatch.setattr(dates, "dateAnchors", DateAnchors())
+    return create
+
+
+def first_post_at(fake: FakeChannel, date: datetime.datetime, high: int) -> int:
+    return min((messageId for messageId, postDate in fake.posts.items() if postDate >= date), default=high)
+
+
+def test_search(channel):
+    channel(1000)
+
+    assert asyncio.run(_search(1, START + datetime.timedelta(hours=500), 1, 1001)) == 500
+    assert asyncio.run(_search(1, START, 1, 1001)) == 1
+    assert asyncio.run(_search(1, START + datetime.timedelta(days=365), 1, 1001)) == 1001
+
+
+def test_search_with_gaps(channel):
+    random.seed(0)
+    #  Long runs of deleted ids around the searched posts
+    deleted = set(range(100, 400)) | set(range(600, 620)) | set(random.sample(range(1, 2001), 500))
+    fake = channel(2000, deleted)
+
+    for hours in (0, 1, 99, 100, 250, 399, 400, 605, 1500, 2000, 2500):
+        date = START + datetime.timedelta(hours=hours)
+        assert asyncio.run(_search(1, date, 1, 2001)) == first_post_at(fake, date, 2001)
+
+
+def test_search_deleted_tail(channel):
+    channel(1000, set(range(900, 1001)))
+    date = START + datetime.timedelta(hours=950)
+
+    assert asyncio.run(_search(1, date, 1, 1001)) == 1001
+
+
+def test_get_last_post_id(channel, db):
+    fake = channel(5000)
+
+    assert asyncio.run(get_last_post_id(1)) == 5000
+    assert fake.requests < 30
+
+
+def test_get_last_post_id_with_gaps(channel, db):
+    #  Deleted ids inside the windows and the deleted last posts
+    deleted = set(range(1000, 1150)) | set(range(4990, 5001))
+    channel(5000, deleted)
+
+    assert asyncio.run(get_last_post_id(1)) == 4989
+
+
+def test_get_last_post_id_starts_from_index(channel, db):
+    fake = channel(10000)
+    asyncio.run(db.channels_index.insert_one({
+        "_id": 1,
+        "ranges": [[1, 9000]],
+        "firstId": 1,
+        "lastId": 9000,
+        "firstDate": fake.posts[1],
+        "lastDate": fake.posts[9000]
+    }))
+
+    assert asyncio.run(get_last_post_id(1)) == 10000
+    assert fake.requests < 20
+
+
+def test_resolve_date(channel, db):
+    fake = channel(3000, set(range(1200, 1300)))
+
+    for hours in (1, 1250, 2999, 4000):
+        date = START + datetime.timedelta(hours=hours)
+        assert asyncio.run(resolve_date(1, date)) == first_post_at(fake, date, 3001)
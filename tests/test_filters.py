@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from shterens_tools.common.stats import filters
+from shterens_tools.common.stats.tags import TagTable
+from shterens_tools.common.stats.filters import TagFilter
+
+
+@pytest.fixture
+def table(db, monkeypatch):
+    '''
+    Empty tagTable of the process
+    '''
+    table = TagTable()
+    monkeypatch.setattr(filters, "tagTable", table)
+    return table
+
+
+def test_empty_filter():
+    tagFilter = TagFilter()
+
+    assert not tagFilter
+    assert tagFilter.apply([1, 2]) == [1, 2]
+
+
+def test_include():
+    tagFilter = TagFilter(include=[1, 3])
+
+    assert tagFilter
+    assert tagFilter.apply([1, 2, 3, 4]) == [1, 3]
+    assert tagFilter.apply_counts({1: 5, 2: 7}) == {1: 5}
+
+
+def test_exclude():
+    tagFilter = TagFilter(exclude=[2])
+
+    assert tagFilter
+    assert tagFilter.apply([1, 2, 3]) == [1, 3]
+    assert tagFilter.apply_counts({1: 5, 2: 7}) == {1: 5}
+
+
+def test_include_ignores_exclude():
+    tagFilter = TagFilter(include=[1, 2], exclude=[2])
+
+    assert tagFilter.exclude == frozenset()
+    assert tagFilter.apply([1, 2, 3]) == [1, 2]
+
+
+def test_from_tags_doesnt_add_tags(db, table):
+    async def main():
+        btc, = await table.intern(["BTC"])
+        tagFilter = await TagFilter.from_tags(["#btc", "#Eth"], ["sol"])
+
+        assert tagFilter.include == {btc}
+        assert tagFilter.includeNames == {"eth"}
+        assert tagFilter.exclude == frozenset() and tagFilter.excludeNames == frozenset()
+        assert tagFilter.apply([btc, btc + 1]) == [btc]
+        assert await db.tags.count_documents({}) == 1
+
+    asyncio.run(main())
+
+
+def test_unknown_tags_are_resolved(table):
+    async def main():
+        tagFilter = await TagFilter.from_tags(exclude=["#ETH", "sol"])
+
+        assert tagFilter and tagFilter.exclude == frozenset()
+
+        #  The tag is interned during the scan
+        eth, = await table.intern(["eth"])
+        tagFilter.resolve()
+
+        assert tagFilter.exclude == {eth}
+        assert tagFilter.excludeNames == {"sol"}
+        assert tagFilter.apply([eth, eth + 1]) == [eth + 1]
+
+        #  The tag is added by another instance
+        sol, = await TagTable().intern(["sol"])
+        tagFilter.resolve()
+
+        assert tagFilter.pending
+        await tagFilter.refresh()
+
+        assert tagFilter.exclude == {eth, sol} and not tagFilter.pending
+
+    asyncio.run(main())
+
+
+def test_unknown_include_counts_nothing(table):
+    async def main():
+        tagFilter = await TagFilter.from_tags(["#new"])
+
+        assert tagFilter
+        assert tagFilter.apply([1, 2]) == []
+        assert tagFilter.apply_counts({1: 5}) == {}
+
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+import random
+from collections import Counter
+from shterens_tools.common.stats.heavyhitters import SpaceSaving
+
+
+def summary_of(tags, capacity):
+    summary = SpaceSaving(capacity)
+    for tag in tags:
+        summary.add(tag)
+    return summary
+
+
+def check_bounds(summary, exact):
+    '''
+    Counts are never underestimated and overestimated by at most their error,
+    tags that aren't kept are not more frequent than minCount
+    '''
+    for tag, count in exact.items():
+        if tag in summary.counts:
+            assert exact[tag] <= summary.counts[tag] <= exact[tag] + summary.errors[tag]
+            assert summary.errors[tag] <= summary.maxError
+        else:
+            assert count <= summary.minCount
+
+
+def test_exact_below_capacity():
+    summary = summary_of([1, 2, 2, 3, 3, 3], 5)
+
+    assert summary.counts == {1: 1, 2: 2, 3: 3}
+    assert summary.maxError == 0
+    assert summary.top(2) == [(3, 3), (2, 2)]
+
+
+def test_eviction_inherits_min_count():
+    summary = summary_of([1, 1, 2, 3], 2)
+
+    assert summary.counts == {1: 2, 3: 2}
+    assert summary.errors[3] == 1
+    check_bounds(summary, Counter([1, 1, 2, 3]))
+
+
+def test_merge_credits_missing_tags():
+    #  X is only in the first summary and was evicted from the second one
+    first = summary_of(["X"] * 5, 2)
+    second = summary_of(["X"] * 4 + ["Y"] * 5 + ["Z"] * 5, 2)
+    first.merge(second)
+
+    assert "X" in first.counts
+    assert first.counts["X"] >= 9
+    assert first.maxError == 5
+    check_bounds(first, Counter(["X"] * 9 + ["Y"] * 5 + ["Z"] * 5))
+
+
+def test_merge_chunks():
+    random.seed(0)
+
+    for _ in range(200):
+        capacity = random.randint(1, 8)
+        stream = [int(random.paretovariate(1.2)) for _ in range(random.randint(0, 300))]
+        chunks = [stream[start:start+50] for start in range(0, len(stream), 50)]
+
+        summary = SpaceSaving(capacity)
+        for chunk in chunks:
+            summary.merge(summary_of(chunk, capacity))
+            #  Summaries are extended after merges too
+            summary.add(0)
+            stream.append(0)
+
+        assert summary.total == len(stream)
+        check_bounds(summary, Counter(stream))
+
+
+def test_discard():
+    summary = summary_of([1, 1, 2], 2)
+    summary.discard(1)
+    summary.discard(3)
+
+    assert summary.counts == {1: 1, 2: 1}
+    assert summary.total == 2
+
+
+def test_document_round_trip():
+    summary = summary_of([1, 2, 3, 3], 2)
+    summary.merge(summary_of([4, 4, 5], 2))
+    restored = SpaceSaving.from_document(summary.to_document())
+
+    assert restored.counts == summary.counts
+    assert restored.errors == summary.errors
+    assert restored.floor == summary.floor
+    assert restored.total == summary.total
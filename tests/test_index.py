@@ -0,0 +1,186 @@
+import random
+import asyncio
+import datetime
+from collections import Counter
+from shterens_tools.common.stats.index import (
+    merge_ranges,
+    split_range,
+    merge_album_parts,
+    get_channel_index,
+    index_posts
+)
+
+
+def test_merge_ranges():
+    assert merge_ranges([]) == []
+    assert merge_ranges([[5, 9], [1, 3], [4, 4]]) == [[1, 9]]
+    assert merge_ranges([[1, 5], [2, 3], [7, 8]]) == [[1, 5], [7, 8]]
+    assert merge_ranges([[10, 20], [1, 2], [21, 21], [15, 30]]) == [[1, 2], [10, 30]]
+
+
+def test_merge_ranges_keeps_input():
+    ranges = [[1, 3], [2, 5]]
+    merge_ranges(ranges)
+
+    assert ranges == [[1, 3], [2, 5]]
+
+
+def test_split_range():
+    ranges = [[1, 10], [20, 30], [40, 50]]
+
+    assert split_range(ranges, 5, 45) == [
+        (5, 10, True),
+        (11, 19, False),
+        (20, 30, True),
+        (31, 39, False),
+        (40, 45, True)
+    ]
+    assert split_range(ranges, 11, 19) == [(11, 19, False)]
+    assert split_range(ranges, 60, 70) == [(60, 70, False)]
+    assert split_range(ranges, 20, 30) == [(20, 30, True)]
+    assert split_range([], 1, 5) == [(1, 5, False)]
+
+
+def test_split_range_covers_range():
+    ranges = merge_ranges([[3, 4], [8, 8], [10, 12]])
+
+    for startId in range(1, 15):
+        for endId in range(startId, 15):
+            segments = split_range(ranges, startId, endId)
+            ids = [id for start, end, _ in segments for id in range(start, end+1)]
+
+            assert ids == list(range(startId, endId+1))
+            assert all(
+                indexed == any(start <= id <= end for start, end in ranges)
+                for segmentStart, segmentEnd, indexed in segments
+                for id in range(segmentStart, segmentEnd+1)
+            )
+
+
+def post(id, tags, group=None, day=1):
+    return {
+        "chat": 1,
+        "id": id,
+        "date": datetime.datetime(2024, 1, day),
+        "group": group,
+        "size": 1,
+        "tags": tags
+    }
+
+
+def test_merge_album_parts():
+    posts = [post(3, [2], "a"), post(1, [1], "a"), post(2, [3]), post(4, [1, 4], "a")]
+    merged = merge_album_parts(posts)
+
+    assert [(merged["id"], merged["tags"], merged["size"]) for merged in merged] == [
+        (1, [1, 2, 4], 3),
+        (2, [3], 1)
+    ]
+    #  Posts aren't changed
+    assert posts[1]["tags"] == [1]
+
+
+def test_merge_edited_album_parts():
+    merged = merge_album_parts([post(1, [1], "a"), post(2, [2], "a")], edited=True)
+
+    assert [(merged["id"], merged["tags"], merged["size"]) for merged in merged] == [(1, [1, 2], 1)]
+
+
+async def check_counters(db):
+    '''
+    Channel counters and day rollups are equal to the counts of the stored posts
+    '''
+    posts = await db.posts_index.find({ "chat": 1 }).to_list(None)
+    channel = await get_channel_index(1)
+    tags = Counter(tag for post in posts for tag in post["tags"])
+
+    assert channel["posts"] == len(posts)
+    assert {tag: value for tag, value in channel["tags"].items() if value} == tags
+
+    days = Counter(post["date"].strftime("%Y-%m-%d") for post in posts)
+    rollups = await db.rollups.find({ "chat": 1, "period": "day" }).to_list(None)
+    assert {rollup["bucket"]: rollup["posts"] for rollup in rollups} == days
+
+    return posts
+
+
+def test_album_parts_out_of_order(db):
+    async def main():
+        #  Later part of the album is indexed by the next chunk first
+        await index_posts(1, [post(11, [2], "a"), post(12, [3], "a"), post(13, [5])], 11, 20)
+        await index_posts(1, [post(9, [4]), post(10, [1, 2], "a")], 1, 10)
+
+        posts = await check_counters(db)
+        album = next(post for post in posts if post["group"] == "a")
+
+        assert len(posts) == 3
+        assert album["id"] == 10
+        assert sorted(album["tags"]) == [1, 2, 3]
+        assert album["size"] == 3
+        assert sorted(album["parts"]) == [11]
+
+    asyncio.run(main())
+
+
+def test_album_part_after_head(db):
+    async def main():
+        await index_posts(1, [post(10, [1], "a")], 1, 10)
+        await index_posts(1, [post(11, [1, 2], "a")], 11, 20)
+        #  Written again after a failed write
+        await index_posts(1, [post(11, [1, 2], "a")], 11, 20)
+
+        posts = await check_counters(db)
+
+        assert [(post["id"], sorted(post["tags"])) for post in posts] == [(10, [1, 2])]
+
+    asyncio.run(main())
+
+
+def test_concurrent_writers(db):
+    async def main():
+        posts = [post(id, [id % 3], "a" if id in (5, 6) else None, day=id % 4 + 1) for id in range(1, 10)]
+        await asyncio.gather(
+            index_posts(1, [dict(post) for post in posts], 1, 9),
+            index_posts(1, [dict(post) for post in posts[::-1]], 1, 9),
+            index_posts(1, [dict(post) for post in posts[4:]], 5, 9)
+        )
+
+        assert len(await check_counters(db)) == 8
+
+    asyncio.run(main())
+
+
+def test_edited_post(db):
+    async def main():
+        await index_posts(1, [post(1, [1, 2]), post(2, [2])], 1, 2)
+        await index_posts(1, [post(1, [3])], edited=True)
+
+        posts = await check_counters(db)
+
+        assert [post["tags"] for post in posts] == [[3], [2]]
+
+    asyncio.run(main())
+
+
+def test_random_batches(db):
+    random.seed(0)
+
+    async def main():
+        heads = {}
+
+        for _ in range(30):
+            batch = []
+            for id in random.sample(range(1, 60), 8):
+                #  Albums are ids 10-14, 30-32 and 50-51
+                group = next((str(start) for start, end in ((10, 14), (30, 32), (50, 51)) if start <= id <= end), None)
+                batch.append(post(id, random.sample(range(1, 6), random.randint(0, 2)), group, day=id // 10 + 1))
+                if group is not None:
+                    heads[group] = min(heads.get(group, id), id)
+            await index_posts(1, batch, min(post["id"] for post in batch), max(post["id"] for post in batch))
+
+        posts = await check_counters(db)
+        albums = {post["group"]: post["id"] for post in posts if post["group"] is not None}
+
+        assert albums == heads
+
+    asyncio.run(main())
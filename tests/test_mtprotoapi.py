@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from shterens_tools.common.apis import mtprotoapi
+from shterens_tools.common.apis.mtprotoapi import AlbumCache, iter_channel_posts
+
+
+def message(messageId, groupId=None):
+    return SimpleNamespace(id=messageId, media_group_id=groupId)
+
+
+class FakeChannel():
+    '''
+    Channel messages returned by windows, ids without messages
+    are returned as messages without media group
+    '''
+    def __init__(self, groups: dict):
+        #  { message id: media group id }
+        self.groups = groups
+        self.windows = []
+        self.cancelled = []
+        #  Windows starting from this id never finish
+        self.stallFrom = None
+
+    async def get_messages_window(self, chatId, startId, endId):
+        self.windows.append((startId, endId))
+
+        if self.stallFrom is not None and startId >= self.stallFrom:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                self.cancelled.append(startId)
+                raise
+
+        await asyncio.sleep(0)
+        return [message(messageId, self.groups.get(messageId)) for messageId in range(startId, endId+1)]
+
+
+@pytest.fixture
+def channel(monkeypatch):
+    def create(groups: dict) -> FakeChannel:
+        fake = FakeChannel(groups)
+        monkeypatch.setattr(mtprotoapi, "get_messages_window", fake.get_messages_window)
+        return fake
+
+    monkeypatch.setattr(mtprotoapi, "albumCache", AlbumCache())
+    return create
+
+
+def collect(*args, **kwargs):
+    async def main():
+        return [[post.id for post in posts] async for posts in iter_channel_posts(*args, **kwargs)]
+
+    return asyncio.run(main())
+
+
+def test_albums_across_windows(channel):
+    #  Albums end and start at the window boundaries 10 / 11 and 20 / 21
+    fake = channel({
+        9: "a", 10: "a", 11: "a",
+        12: "b", 13: "b",
+        19: "c", 20: "c",
+        21: "d", 22: "d"
+    })
+
+    posts = collect(1, 1, 30, windowSize=10, prefetch=2)
+
+    assert fake.windows == [(1, 10), (11, 20), (21, 30)]
+    assert [9, 10, 11] in posts
+    assert [12, 13] in posts
+    assert [19, 20] in posts
+    assert [21, 22] in posts
+    #  Every id is yielded once and in order
+    assert [messageId for post in posts for messageId in post] == list(range(1, 31))
+
+
+def test_album_cache(channel):
+    #  The first album may have started before the range
+    #  and the last one may continue after it
+    channel({1: "a", 2: "a", 5: "b", 6: "b", 9: "c", 10: "c"})
+
+    posts = collect(1, 1, 10, windowSize=4)
+
+    assert posts[0] == [1, 2] and posts[-1] == [9, 10]
+    assert mtprotoapi.albumCache.get(1, "a") is None
+    assert [album.id for album in mtprotoapi.albumCache.get(1, "b")] == [5, 6]
+
+
+def test_on_window(channel):
+    channel({})
+    windows = []
+
+    async def on_window(messages):
+        windows.append([message.id for message in messages])
+
+    collect(1, 1, 25, windowSize=10, onWindow=on_window)
+
+    assert windows == [list(range(1, 11)), list(range(11, 21)), list(range(21, 26))]
+
+
+def test_close_cancels_windows(channel):
+    fake = channel({})
+    fake.stallFrom = 11
+
+    async def main():
+        posts = iter_channel_posts(1, 1, 100, windowSize=10, prefetch=3)
+
+        async for post in posts:
+            break
+        await posts.aclose()
+
+        #  No window is left running
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(main())
+
+    #  The first window is consumed and the prefetched ones are cancelled,
+    #  the last one is cancelled before it has started
+    assert fake.windows == [(1, 10), (11, 20), (21, 30)]
+    assert sorted(fake.cancelled) == [11, 21]
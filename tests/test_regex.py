@@ -0,0 +1,58 @@
+import pyrogram
+from shterens_tools.common.utils.regex import hashtags_in_entities, hashtags_in_text_regex
+
+
+def entity(text, hashtag, type=pyrogram.enums.MessageEntityType.HASHTAG):
+    '''
+    Creates entity of the first occurrence of hashtag with UTF-16 offset and length
+    '''
+    start = text.index(hashtag)
+    return pyrogram.types.MessageEntity(
+        type=type,
+        offset=len(text[:start].encode("utf-16-le")) // 2,
+        length=len(hashtag.encode("utf-16-le")) // 2
+    )
+
+
+def test_ascii_text():
+    text = "Post #news and #tech"
+    entities = [entity(text, "#news"), entity(text, "#tech")]
+
+    assert hashtags_in_entities(text, entities) == ["news", "tech"]
+
+
+def test_utf16_offsets():
+    #  Emoji outside the BMP take two UTF-16 code units
+    text = "😀😀 Привет #новости 🎉 #tech_2024 #日本"
+    entities = [entity(text, "#новости"), entity(text, "#tech_2024"), entity(text, "#日本")]
+
+    assert hashtags_in_entities(text, entities) == ["новости", "tech_2024", "日本"]
+
+
+def test_hashtag_with_emoji_before():
+    text = "🎉#party"
+
+    assert hashtags_in_entities(text, [entity(text, "#party")]) == ["party"]
+
+
+def test_other_entities_and_duplicates():
+    text = "#news https://t.me #news"
+    entities = [
+        entity(text, "#news"),
+        entity(text, "https://t.me", pyrogram.enums.MessageEntityType.URL),
+        pyrogram.types.MessageEntity(type=pyrogram.enums.MessageEntityType.HASHTAG, offset=19, length=5)
+    ]
+
+    assert hashtags_in_entities(text, entities) == ["news"]
+
+
+def test_bot_api_entity_type():
+    text = "🙂 #news"
+    botEntity = entity(text, "#news")
+    botEntity.type = "hashtag"
+
+    assert hashtags_in_entities(text, [botEntity]) == ["news"]
+
+
+def test_regex_fallback():
+    assert sorted(hashtags_in_text_regex("#one text #two\n#one")) == ["one", "two"]
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from shterens_tools.common.stats import results
+from shterens_tools.common.stats.results import ResultCache
+
+
+@pytest.fixture(autouse=True)
+def fast_wait(monkeypatch):
+    monkeypatch.setattr(results, "RESULT_WAIT_INTERVAL", 0.01)
+
+
+def counting(result, delay=0.05):
+    calls = []
+
+    async def compute():
+        calls.append(None)
+        await asyncio.sleep(delay)
+        return result
+
+    return compute, calls
+
+
+def test_single_flight():
+    async def main():
+        cache = ResultCache()
+        compute, calls = counting("stats")
+        found = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(10)))
+
+        assert found == ["stats"] * 10
+        assert len(calls) == 1
+        #  Result is cached after the computation
+        assert await cache.get_or_compute("key", compute) == "stats"
+        assert len(calls) == 1
+
+    asyncio.run(main())
+
+
+def test_different_keys():
+    async def main():
+        cache = ResultCache()
+        compute, calls = counting("stats")
+        await asyncio.gather(cache.get_or_compute(1, compute), cache.get_or_compute(2, compute))
+
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_cancelled_result_is_computed_again():
+    async def main():
+        cache = ResultCache()
+        cancelledCompute, _ = counting(None)
+        compute, calls = counting("stats")
+
+        first = asyncio.ensure_future(cache.get_or_compute("key", cancelledCompute))
+        await asyncio.sleep(0)
+        waiting = await cache.get_or_compute("key", compute)
+
+        assert await first is None
+        assert waiting == "stats"
+        assert len(calls) == 1
+        assert cache.get("key") == "stats"
+
+    asyncio.run(main())
+
+
+def test_failed_computation():
+    async def main():
+        cache = ResultCache()
+        compute, calls = counting("stats")
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise RuntimeError
+
+        first = asyncio.ensure_future(cache.get_or_compute("key", failing))
+        await asyncio.sleep(0)
+
+        assert await cache.get_or_compute("key", compute) == "stats"
+        with pytest.raises(RuntimeError):
+            await first
+        assert len(calls) == 1
+
+    asyncio.run(main())
+
+
+def test_waiting_caller_cancelled():
+    async def main():
+        cache = ResultCache()
+        compute, _ = counting("stats", delay=1)
+
+        running = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+
+        assert await cache.get_or_compute("key", compute, cancelled=lambda: True) is None
+        running.cancel()
+
+    asyncio.run(main())
+
+
+def test_ttl_and_size():
+    cache = ResultCache(size=2, ttl=-1)
+    cache.put("expired", 1)
+
+    assert cache.get("expired") is None
+
+    cache = ResultCache(size=2)
+    for key in ("first", "second", "third"):
+        cache.put(key, key)
+
+    assert cache.get("first") is None
+    assert cache.get("third") == "third"
@@ -0,0 +1,81 @@
+import random
+import datetime
+from shterens_tools.common.stats.accumulator import StatsAccumulator
+from shterens_tools.common.stats.sampling import SampleEstimate, sample_windows
+
+
+def window_stats(posts, tags):
+    stats = StatsAccumulator()
+    date = datetime.datetime(2024, 1, 1)
+    for messageId in range(posts):
+        stats.add_post(messageId, tags if messageId == 0 else [], date)
+    return stats
+
+
+def test_sample_windows_small_range():
+    assert sample_windows(1, 1000, 10, 200) == [(1, 1000)]
+
+
+def test_sample_windows():
+    random.seed(0)
+
+    for stratified in (True, False):
+        windows = sample_windows(1, 100000, 20, 200, stratified)
+
+        assert len(windows) == 20
+        assert all(end - start + 1 == 200 and 1 <= start and end <= 100000 for start, end in windows)
+        #  Windows are ordered and don't overlap
+        assert all(first[1] < second[0] for first, second in zip(windows, windows[1:]))
+
+
+def test_sample_windows_stratified():
+    random.seed(0)
+    windows = sample_windows(1, 10000, 10, 200)
+
+    for number, (start, end) in enumerate(windows):
+        assert 1 + number * 1000 <= start and end <= (number + 1) * 1000
+
+
+def test_exact_estimate():
+    estimate = SampleEstimate(400)
+    estimate.add_window(200, window_stats(50, [1]))
+    estimate.add_window(200, window_stats(30, [1, 2]))
+
+    assert estimate.exact
+    assert estimate.posts == (80, 0)
+    assert estimate.tags == {1: (2, 0), 2: (1, 0)}
+
+
+def test_estimate():
+    estimate = SampleEstimate(2000)
+    estimate.add_window(200, window_stats(40, [1]))
+    estimate.add_window(200, window_stats(60, []))
+
+    posts, margin = estimate.posts
+
+    assert not estimate.exact
+    #  Mean density 0.25 posts per id
+    assert posts == 500
+    assert 0 < margin < 500
+    assert estimate.tags[1][0] == 5
+
+
+def test_estimate_uniform_windows():
+    estimate = SampleEstimate(10000)
+    for _ in range(5):
+        estimate.add_window(200, window_stats(100, []))
+
+    assert estimate.posts == (5000, 0)
+
+
+def test_margin_shrinks_with_windows():
+    random.seed(0)
+    margins = []
+
+    for windows in (5, 50):
+        estimate = SampleEstimate(10 ** 6)
+        for _ in range(windows):
+            estimate.add_window(200, window_stats(random.randint(20, 80), []))
+        margins.append(estimate.posts[1])
+
+    assert margins[1] < margins[0]
@@ -0,0 +1,62 @@
+import datetime
+from shterens_tools.common.stats.accumulator import StatsAccumulator
+from shterens_tools.common.stats.scanner import ChannelScanner, merge_scan_results
+
+
+def day(number):
+    return datetime.datetime(2024, 1, number, 12)
+
+
+#  ( message id, tag ids, album id, date ), album "b" has ids from 3 to 5
+POSTS = [
+    (1, [10], None, day(1)),
+    (2, [], "a", day(1)),
+    (3, [11], "b", day(2)),
+    (4, [11], "b", day(2)),
+    (5, [11], "b", day(2)),
+    (6, [10, 12], None, day(3)),
+    (7, [], "c", day(3))
+]
+
+
+async def on_progress(done):
+    return True
+
+
+def scan_result(posts):
+    scanner = ChannelScanner(1, StatsAccumulator(histogram=True), on_progress)
+    for post in posts:
+        scanner._count_post(*post)
+    return {"stats": scanner.stats, "first": scanner.firstPost, "group": scanner.lastGroup}
+
+
+def test_merge_scan_results():
+    whole = scan_result(POSTS)["stats"]
+
+    #  Ranges split inside album "b", between posts and around the album "b"
+    for splits in ([3], [4], [5], [3, 4], [3, 5], [4, 5], [1, 6], [2, 3, 4, 5]):
+        bounds = [0] + splits + [len(POSTS)]
+        results = [scan_result(POSTS[start:end]) for start, end in zip(bounds, bounds[1:])]
+        merged = merge_scan_results(results)["stats"]
+
+        assert (merged.first, merged.last, merged.count) == (1, 7, 5)
+        assert merged.tags == whole.tags == {10: 2, 11: 1, 12: 1}
+        assert merged.days == whole.days
+
+
+def test_merge_scan_results_empty_ranges():
+    results = [scan_result(POSTS[:3]), scan_result([]), scan_result(POSTS[3:5]), scan_result(POSTS[5:])]
+    merged = merge_scan_results(results)
+
+    assert merged["stats"].count == 5
+    assert merged["first"] == (1, [10], None, day(1))
+    assert merged["group"] == "c"
+
+
+def test_merge_scan_results_range_of_album_part():
+    #  The second range contains only a part of the album started before it
+    results = [scan_result(POSTS[:4]), scan_result(POSTS[4:5]), scan_result(POSTS[5:])]
+    merged = merge_scan_results(results)["stats"]
+
+    assert merged.count == 5
+    assert merged.tags == {10: 2, 11: 1, 12: 1}
@@ -0,0 +1,45 @@
+import asyncio
+from shterens_tools.common.stats.tags import TagTable, normalize_tag
+
+
+def test_normalize_tag():
+    assert normalize_tag("#BTC") == normalize_tag("btc") == "btc"
+
+
+def test_intern_many(db):
+    async def main():
+        table = TagTable()
+        first, empty, second = await table.intern_many([["#a", "B"], [], ["b", "c", "a"]])
+        a, b = first
+        c = second[1]
+
+        assert second == [b, c, a]
+        assert len({a, b, c}) == 3
+        assert empty == []
+        #  Known tags keep their ids in another process
+        assert await TagTable().intern(["A", "c", "#a"]) == [a, c]
+        assert await db.counters.find_one({ "_id": "tags" }) == { "_id": "tags", "value": 3 }
+
+    asyncio.run(main())
+
+
+def test_cache_is_bounded(db):
+    async def main():
+        table = TagTable(size=2)
+        ids = await table.intern(["a", "b", "c"])
+
+        assert len(table._ids) == len(table._names) == 2
+        assert await table.intern(["a", "b", "c"]) == ids
+        assert await table.names(ids) == dict(zip(ids, ["a", "b", "c"]))
+
+    asyncio.run(main())
+
+
+def test_first_spelling_is_shown(db):
+    async def main():
+        btc, = await TagTable().intern(["#BTC"])
+
+        assert await TagTable().intern(["btc", "Btc"]) == [btc]
+        assert await TagTable().names([btc]) == { btc: "BTC" }
+
+    asyncio.run(main())
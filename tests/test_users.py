@@ -0,0 +1,52 @@
+import os
+import asyncio
+from shterens_tools.common.resources import mongodb
+from shterens_tools.common.resources.mongodb import UserCache, UserWriteBuffer, user_by_id
+
+
+class FakeLog():
+    '''
+    Log of user changes written by the instances, see RealLog
+    '''
+    def __init__(self):
+        self.objects = []
+
+    def append(self, obj):
+        self.objects.append(obj)
+
+    def end(self) -> int:
+        return len(self.objects)
+
+    def read(self, position: int):
+        return len(self.objects), self.objects[position:]
+
+
+def test_user_changes_of_other_instances(db, monkeypatch):
+    monkeypatch.setattr(mongodb, "userCache", UserCache())
+    monkeypatch.setattr(mongodb, "userWrites", UserWriteBuffer())
+
+    async def main():
+        changes = FakeLog()
+        mongodb.listen_user_changes(changes, interval=0.01)
+        await db.users.insert_one({ "_id": 1, "language": "en" })
+
+        assert (await user_by_id(1))["language"] == "en"
+
+        #  Another instance changes the user
+        await db.users.update_one({ "_id": 1 }, { "$set": { "language": "ru" } })
+        assert (await user_by_id(1))["language"] == "en"
+        changes.append((os.getpid() + 1, [1]))
+        await asyncio.sleep(0.05)
+
+        assert (await user_by_id(1))["language"] == "ru"
+
+        #  Changes of this instance are sent to others
+        await mongodb.set_lang(1, "fr")
+        await mongodb.userWrites.flush()
+
+        assert changes.objects[-1] == (os.getpid(), [1])
+        assert (await db.users.find_one({ "_id": 1 }))["language"] == "fr"
+
+        mongodb._userChangesTask.cancel()
+
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+import os
+import datetime
+import numpy as np
+from shterens_tools.common.stats import warehouse as warehouseModule
+from shterens_tools.common.stats.warehouse import NO_TAG, ChannelWarehouse, posts_to_rows, _load, _save
+
+
+def post(id, tags, day=1):
+    return { "id": id, "date": datetime.datetime(2024, 1, day), "tags": tags }
+
+
+def test_posts_to_rows():
+    ids, dates, tags = posts_to_rows([post(1, [5, 6]), post(2, [])])
+
+    assert ids.tolist() == [1, 1, 2]
+    assert tags.tolist() == [5, 6, NO_TAG]
+    assert dates.dtype == np.dtype("datetime64[s]")
+
+
+def test_replace_posts():
+    warehouse = ChannelWarehouse(1, *posts_to_rows([post(1, [5]), post(3, [5, 6]), post(5, [])]))
+    warehouse = warehouse.replace_posts([post(3, [7], day=2), post(4, [8]), post(6, [])])
+
+    assert warehouse.ids.tolist() == [1, 3, 4, 5, 6]
+    assert warehouse.tags.tolist() == [5, 7, 8, NO_TAG, NO_TAG]
+    assert warehouse.dates[1] == np.datetime64("2024-01-02")
+
+
+def test_replace_posts_removes_merged_parts():
+    warehouse = ChannelWarehouse(1, *posts_to_rows([post(1, [5]), post(2, [6]), post(3, [7])]))
+    warehouse = warehouse.replace_posts([dict(post(1, [5, 6]), parts=[2])])
+
+    assert warehouse.ids.tolist() == [1, 1, 3]
+    assert warehouse.tags.tolist() == [5, 6, 7]
+
+
+def test_save_and_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(warehouseModule, "warehousePath", str(tmp_path))
+    warehouse = ChannelWarehouse(1, *posts_to_rows([post(1, [5, 6]), post(2, [])]))
+
+    _save(warehouse, "2024-01-01T00:00:00")
+    _save(warehouse.replace_posts([post(3, [7])]), "2024-01-02T00:00:00")
+    loaded, updated = _load(1)
+
+    assert updated == "2024-01-02T00:00:00"
+    assert loaded.ids.tolist() == [1, 1, 2, 3]
+    assert loaded.tags.tolist() == [5, 6, NO_TAG, 7]
+    #  Temporary files are moved to the columns
+    assert sorted(os.listdir(tmp_path / "1")) == ["dates.npy", "ids.npy", "meta.json", "tags.npy"]